@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file benchmark.py, which times the ball physics on its own and
+# inside the bouncing balls scene and saves the results as JSON
+#
+
+"""
+Micro and macro benchmarks for the bouncing ball physics.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# SDL reads these when pygame is initialized, so set them before importing.
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+# pylint: disable=wrong-import-position
+import numpy as np
+import pygame
+from game import rgbcolors
+from game.ball import Ball
+from game.physics import BallSystem
+from game.scene import BouncingBallsScene
+
+
+def seeded_balls(count, seed, size=800):
+    """Return count Ball views sharing one BallSystem, placed from seed."""
+    random.seed(seed)
+    system = BallSystem(count)
+    low = Ball.default_radius
+    high = size - Ball.default_radius
+    return [
+        Ball(
+            i,
+            random.uniform(low, high),
+            random.uniform(low, high),
+            sound_on=False,
+            system=system,
+        )
+        for i in range(count)
+    ]
+
+
+def _save_state(system):
+    """Copy every array of the system so a run can start over."""
+    return [
+        array.copy()
+        for array in (
+            system.positions,
+            system.velocities,
+            system.colors,
+            system.collisions,
+            system.alive,
+        )
+    ]
+
+
+def _restore_state(system, state):
+    """Put back the arrays saved by _save_state."""
+    for array, saved in zip(
+        (
+            system.positions,
+            system.velocities,
+            system.colors,
+            system.collisions,
+            system.alive,
+        ),
+        state,
+    ):
+        array[...] = saved
+
+
+def _summary(values):
+    """Return mean, stdev, min and median of values."""
+    return {
+        'mean': statistics.mean(values),
+        'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'min': min(values),
+        'median': statistics.median(values),
+    }
+
+
+def measure_allocations(call, runs, live=None):
+    """Count what up to runs calls allocate; return a dict of the results.
+
+    blocks_per_op is the median number of memory blocks a call leaves
+    allocated, counted with sys.getallocatedblocks once the garbage is
+    collected. A one-off cost, such as numpy importing a module the first
+    time a function is used, does not count; a call that keeps something
+    every time it runs does, and the garbage collector walks more objects
+    every time it runs after that.
+    temporary_bytes_per_op is the mean peak memory tracemalloc sees
+    allocated during each call, most of it freed again before it returns.
+    Calls stop early once live(), if given, returns False, so only calls
+    doing real work are measured.
+    """
+    kept = []
+    peak_bytes = 0
+    gc.collect()
+    before = sys.getallocatedblocks()
+    # Starting and stopping tracemalloc while the mixer's thread ends a
+    # sound can crash, so it runs once for all the calls and the sounds
+    # are stopped before it does.
+    tracemalloc.start()
+    for _ in range(runs):
+        if live is not None and not live():
+            break
+        # Clearing the traces forgets the last call's peak as well.
+        tracemalloc.clear_traces()
+        call()
+        peak_bytes += tracemalloc.get_traced_memory()[1]
+        gc.collect()
+        after = sys.getallocatedblocks()
+        kept.append(after - before)
+        before = after
+    pygame.mixer.stop()
+    tracemalloc.stop()
+    return {
+        'allocation_ops': len(kept),
+        'blocks_per_op': statistics.median(kept) if kept else 0,
+        'temporary_bytes_per_op': peak_bytes / max(len(kept), 1),
+    }
+
+
+def time_method(name, balls, call, ops, warmup, repeat):
+    """Time call(first, second, rect) on about ops pairs; return a result.
+
+    Balls are paired off two by two, so each ball is in one pair. The
+    pairs are replayed from the same saved state as many times as it takes
+    to make ops calls, so a method that moves balls never compounds its
+    own moves.
+    """
+    system = balls[0]._system  # pylint: disable=protected-access
+    state = _save_state(system)
+    pairs = list(zip(balls[0::2], balls[1::2]))[:ops]
+    passes = -(-ops // len(pairs))
+    rect = pygame.Rect(0, 0, 800, 800)
+    samples = []
+    for run in range(warmup + repeat):
+        elapsed = 0.0
+        for _ in range(passes):
+            _restore_state(system, state)
+            start = time.perf_counter()
+            for first, second in pairs:
+                call(first, second, rect)
+            elapsed += time.perf_counter() - start
+        if run >= warmup:
+            samples.append(elapsed / (passes * len(pairs)) * 1e9)
+    _restore_state(system, state)
+    pair_calls = iter(pairs * -(-ALLOCATION_OPS // len(pairs)))
+    allocated = measure_allocations(
+        lambda: call(*next(pair_calls), rect), ALLOCATION_OPS
+    )
+    _restore_state(system, state)
+    return {
+        'benchmark': name,
+        'balls': len(balls),
+        'ops': passes * len(pairs),
+        'warmup': warmup,
+        'repeat': repeat,
+        'ns_per_op': _summary(samples),
+        **allocated,
+    }
+
+
+def _scene(screen, count, seed, broadphase, snapshot_path):
+    """Return a new BouncingBallsScene to benchmark."""
+    return BouncingBallsScene(
+        count,
+        screen,
+        rgbcolors.BLACK,
+        60,
+        broadphase=broadphase,
+        seed=seed,
+        snapshot_path=snapshot_path,
+    )
+
+
+def time_scene(
+    screen, count, seed, frames, warmup, repeat, broadphase, snapshot_path=None
+):
+    """Time BouncingBallsScene.update_scene over frames; return a result.
+
+    With snapshot_path every repeat starts from the balls saved in that file
+    instead of count freshly placed ones.
+    """
+    samples = []
+    balls = 0
+    for run in range(warmup + repeat):
+        scene = _scene(screen, count, seed, broadphase, snapshot_path)
+        scene.start_scene()
+        balls = len(scene.system)
+        start = time.perf_counter()
+        for _ in range(frames):
+            scene.update_scene()
+        elapsed = time.perf_counter() - start
+        scene.end_scene()
+        if run >= warmup:
+            samples.append(frames / elapsed)
+    # Large scenes are all dead within a few dozen frames, so allocations
+    # are counted on a fresh scene, over the frames it still moves in. Each
+    # frame is stepped and drawn as the game would, but explosions are
+    # turned off, as every one is a sprite that lives for a dozen frames.
+    scene = _scene(screen, count, seed, broadphase, snapshot_path)
+    scene.start_scene()
+    scene.process_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_e))
+
+    def frame():
+        scene.update_scene()
+        scene.draw()
+        scene.render_updates()
+        scene.end_frame()
+
+    allocated = measure_allocations(
+        frame, ALLOCATION_OPS, lambda: not scene.system.quiescent
+    )
+    scene.end_scene()
+    return {
+        'benchmark': f'BouncingBallsScene.update_scene[{broadphase}]',
+        'requested_balls': count,
+        'balls': balls,
+        'frames': frames,
+        'warmup': warmup,
+        'repeat': repeat,
+        'frames_per_sec': _summary(samples),
+        **allocated,
+    }
+
+
+# Calls made, or frames stepped, while counting allocations.
+ALLOCATION_OPS = 200
+
+# Most memory blocks a typical call or frame may leave allocated before the
+# run fails. Steady state work should leave nothing behind.
+MAX_BLOCKS_PER_OP = 0
+
+METHODS = {
+    'Ball.update': lambda first, second, rect: first.update(),
+    'Ball.collide_with': lambda first, second, rect: first.collide_with(
+        second
+    ),
+    'Ball.separate_from': lambda first, second, rect: first.separate_from(
+        second, rect
+    ),
+    'Ball.bounce': lambda first, second, rect: first.bounce(second),
+}
+
+
+def _git_commit():
+    """Return the current git commit, or None outside a repository."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_result(result):
+    """Print one result as a line of the results table."""
+    if 'ns_per_op' in result:
+        stats = result['ns_per_op']
+        unit = 'ns/op'
+    else:
+        stats = result['frames_per_sec']
+        unit = 'frames/sec'
+    print(
+        f"{result['benchmark']:<44} {result['balls']:>7} "
+        f"{stats['mean']:>12.1f} +- {stats['stdev']:<10.1f} {unit} "
+        f"{result['temporary_bytes_per_op']:>10.0f} temp B/op "
+        f"{result['blocks_per_op']:>8.1f} blocks/op"
+    )
+
+
+def ball_counts(text):
+    """Return the ball counts in text, for argparse.
+
+    The methods are timed on pairs of balls, so every count must be 2 or
+    more.
+    """
+    try:
+        counts = [int(part) for part in text.split(',')]
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            f'expected comma separated ball counts, not "{text}"'
+        ) from error
+    if min(counts) < 2:
+        raise argparse.ArgumentTypeError(
+            f'every ball count must be at least 2, not "{text}"'
+        )
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        '--counts',
+        type=ball_counts,
+        default=[5, 50, 500, 5000, 100000],
+        help='comma separated ball counts',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--ops',
+        type=int,
+        default=20000,
+        help='most calls timed per method benchmark',
+    )
+    parser.add_argument(
+        '--frames', type=int, default=20, help='scene steps per repeat'
+    )
+    parser.add_argument(
+        '--broadphase',
+        choices=('grid', 'sweep', 'brute', 'strips'),
+        default='grid',
+    )
+    parser.add_argument(
+        '--snapshot',
+        help='start every scene benchmark from this snapshot file',
+    )
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args()
+
+    pygame.init()
+    SCREEN = pygame.display.set_mode((800, 800))
+    RESULTS = []
+    for COUNT in args.counts:
+        BALLS = seeded_balls(COUNT, args.seed)
+        for NAME, CALL in METHODS.items():
+            RESULTS.append(
+                time_method(
+                    NAME,
+                    BALLS,
+                    CALL,
+                    args.ops,
+                    args.warmup,
+                    args.repeat,
+                )
+            )
+            _print_result(RESULTS[-1])
+        RESULTS.append(
+            time_scene(
+                SCREEN,
+                COUNT,
+                args.seed,
+                args.frames,
+                args.warmup,
+                args.repeat,
+                args.broadphase,
+                args.snapshot,
+            )
+        )
+        _print_result(RESULTS[-1])
+
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(
+            {
+                'commit': _git_commit(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'pygame': pygame.version.ver,
+                'numpy': np.__version__,
+                'seed': args.seed,
+                'results': RESULTS,
+            },
+            output,
+            indent=2,
+        )
+    print(f'Wrote {args.output}')
+    pygame.quit()
+    FAILED = [
+        result
+        for result in RESULTS
+        if result['blocks_per_op'] > MAX_BLOCKS_PER_OP
+    ]
+    for RESULT in FAILED:
+        print(
+            f"FAIL {RESULT['benchmark']} at {RESULT['balls']} balls keeps "
+            f"{RESULT['blocks_per_op']:.1f} blocks/op, more than "
+            f'{MAX_BLOCKS_PER_OP}'
+        )
+    if FAILED:
+        sys.exit(1)
@@ -15,16 +15,190 @@
 Imports the Bounce demo and executes the main function.
 """
 
-import sys
-from game import game
+import argparse
+import os
+import random
+
+
+def physics_rate(text):
+    """Return text as a physics rate, which must be from 30 to 120."""
+    rate = int(text)
+    if not 30 <= rate <= 120:
+        raise argparse.ArgumentTypeError(
+            f'the physics rate must be from 30 to 120, not {rate}'
+        )
+    return rate
+
+
+def frame_window(text):
+    """Return text, FIRST:LAST with FIRST before LAST, as (first, last)."""
+    try:
+        first, last = (int(part) for part in text.split(':'))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            f'expected FIRST:LAST frame numbers, not "{text}"'
+        ) from error
+    if not 0 <= first < last:
+        raise argparse.ArgumentTypeError(
+            f'FIRST must be at least 0 and before LAST, not "{text}"'
+        )
+    return first, last
+
 
 if __name__ == "__main__":
-    NUM_BALLS = 5
-    if len(sys.argv) > 1:
-        NUM_BALLS = int(sys.argv[1])
-    if NUM_BALLS >= 50:
-        NUM_BALLS = 49
-    NUM_BALLS = max(NUM_BALLS, 3)
-    video_game = game.BounceDemo(NUM_BALLS)
-    video_game.build_scene_graph()
-    video_game.run()
+    parser = argparse.ArgumentParser(description='Bouncing balls demo.')
+    parser.add_argument(
+        'num_balls', nargs='?', type=int, default=5, help='number of balls'
+    )
+    parser.add_argument(
+        '--broadphase',
+        choices=('grid', 'sweep', 'brute', 'strips'),
+        default='grid',
+        help='how collision pairs are found; strips also steps large '
+        'scenes in one worker process per CPU',
+    )
+    parser.add_argument(
+        '--frame-rate',
+        type=int,
+        default=60,
+        help='most frames drawn per second, 0 for no limit',
+    )
+    parser.add_argument(
+        '--physics-rate',
+        type=physics_rate,
+        default=60,
+        help='physics steps per second (30 to 120), independent of drawing',
+    )
+    parser.add_argument(
+        '--ccd',
+        action='store_true',
+        help='bounce balls at the moment they touch instead of on overlap',
+    )
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help='step the physics with no window or frame cap, print timings',
+    )
+    parser.add_argument(
+        '--frames',
+        type=int,
+        default=1000,
+        help='number of physics steps in headless mode, or of frames to '
+        'capture',
+    )
+    parser.add_argument('--seed', type=int, help='seed the random numbers')
+    parser.add_argument(
+        '--record', metavar='FILE', help='save a replay of the run to FILE'
+    )
+    parser.add_argument(
+        '--timings',
+        metavar='FILE',
+        help='save per-phase frame time histograms to FILE on exit',
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='FIRST:LAST',
+        type=frame_window,
+        help='profile the balls scene from frame FIRST up to frame LAST, '
+        'counting from 0',
+    )
+    parser.add_argument(
+        '--profile-summary',
+        action='store_true',
+        help='also save the top functions of each profile as text',
+    )
+    parser.add_argument(
+        '--snapshot',
+        metavar='FILE',
+        help='start from the balls saved in the snapshot FILE',
+    )
+    parser.add_argument(
+        '--checkpoint',
+        metavar='FILE',
+        help='save a snapshot of the balls to FILE when the scene ends',
+    )
+    parser.add_argument(
+        '--trajectory',
+        metavar='FILE',
+        help="record every ball's position, velocity and state to FILE",
+    )
+    parser.add_argument(
+        '--trajectory-every',
+        metavar='K',
+        type=int,
+        default=1,
+        help='record the trajectory every K physics steps',
+    )
+    parser.add_argument(
+        '--splat-above',
+        metavar='N',
+        type=int,
+        default=50000,
+        help='with more than N balls, draw them into the pixels with NumPy',
+    )
+    capture_group = parser.add_mutually_exclusive_group()
+    capture_group.add_argument(
+        '--capture',
+        metavar='DIR',
+        help='draw the balls offscreen and save each frame as a PNG in DIR',
+    )
+    capture_group.add_argument(
+        '--capture-raw',
+        metavar='FILE',
+        help='draw the balls offscreen and write raw RGB frames to FILE, '
+        'which may be a named pipe',
+    )
+    parser.add_argument(
+        '--replay',
+        metavar='FILE',
+        help='play the run saved in FILE; its settings replace the others',
+    )
+    args = parser.parse_args()
+
+    CAPTURING = bool(args.capture or args.capture_raw)
+    if args.headless or CAPTURING:
+        # SDL reads these when pygame is initialized, so set them first.
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    # pylint: disable=wrong-import-position
+    from game import game
+    from game.capture import PngCapture, RawCapture
+    from game.replay import Replay
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    REPLAY = None
+    if args.replay:
+        REPLAY = Replay.load(args.replay)
+        for name, value in REPLAY.params.items():
+            setattr(args, name, value)
+    NUM_BALLS = max(args.num_balls, 3)
+    CAPTURE = None
+    if args.capture:
+        CAPTURE = PngCapture(args.capture, args.frames)
+    elif args.capture_raw:
+        CAPTURE = RawCapture(args.capture_raw, args.frames)
+    video_game = game.BounceDemo(
+        NUM_BALLS,
+        args.frame_rate,
+        timings_path=args.timings,
+        capture=CAPTURE,
+        broadphase=args.broadphase,
+        physics_rate=args.physics_rate,
+        ccd=args.ccd,
+        seed=args.seed,
+        replay=REPLAY,
+        record=args.record,
+        profile=args.profile,
+        profile_summary=args.profile_summary,
+        snapshot_path=args.snapshot,
+        checkpoint=args.checkpoint,
+        trajectory=args.trajectory,
+        trajectory_every=args.trajectory_every,
+        splat_above=args.splat_above,
+    )
+    if args.headless:
+        video_game.run_headless(args.frames)
+    else:
+        video_game.build_scene_graph()
+        video_game.run()
@@ -12,4 +12,20 @@
 
 """Init file for the boxes PyGame demo."""
 
-__all__ = ["game", "rgbcolors", "scene"]
+__all__ = [
+    "assets",
+    "audio",
+    "capture",
+    "game",
+    "parallel",
+    "physics",
+    "placement",
+    "profiling",
+    "recorder",
+    "render",
+    "replay",
+    "rgbcolors",
+    "scene",
+    "snapshot",
+    "timing",
+]
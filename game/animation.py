@@ -14,6 +14,7 @@
 
 import os.path
 import pygame
+from game import assets
 
 
 # Adapted aliens.py in pygame/examples
@@ -33,14 +34,8 @@ class Explosion(pygame.sprite.Sprite):
 
     def __init__(self, actor):
         pygame.sprite.Sprite.__init__(self, self.containers)
-        try:
-            surface = pygame.image.load(Explosion.image_path)
-        except pygame.error as pygame_error:
-            raise SystemExit(
-                f'Failed load "{Explosion.image_path}" {pygame.get_error()}'
-            ) from pygame_error
-        img = surface.convert()
         if not Explosion.images:
+            img = assets.image(Explosion.image_path)
             Explosion.images = [img, pygame.transform.flip(img, 1, 1)]
         self.image = self.images[0]
         self.rect = self.image.get_rect(center=actor.rect.center)
@@ -0,0 +1,120 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file assets.py, which loads every sound, font and image the
+# game uses once and hands the same object to everything that asks for it
+#
+
+"""Process-wide registry of sounds, fonts and images, each loaded once."""
+
+import os.path
+import time
+import pygame
+
+# Maps a key such as ('sound', path) to (asset, load seconds, bytes).
+_registry = {}
+
+
+def _load(key, loader, measure):
+    """Return the asset for key, loading and measuring it the first time."""
+    entry = _registry.get(key)
+    if entry is None:
+        start = time.perf_counter()
+        asset = loader()
+        seconds = time.perf_counter() - start
+        entry = (asset, seconds, measure(asset))
+        _registry[key] = entry
+    return entry[0]
+
+
+def sound(path):
+    """Return the shared pygame.mixer.Sound for the file at path."""
+
+    def loader():
+        try:
+            return pygame.mixer.Sound(path)
+        except pygame.error as pygame_error:
+            print(f'Cannot open {path}')
+            raise SystemExit(1) from pygame_error
+
+    return _load(('sound', path), loader, lambda s: len(s.get_raw()))
+
+
+def font(name, size):
+    """Return the shared system font called name (None for the default)."""
+
+    def measure(_):
+        path = pygame.font.match_font(name) if name else None
+        if not path:
+            path = os.path.join(
+                os.path.dirname(pygame.__file__),
+                pygame.font.get_default_font(),
+            )
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    return _load(
+        ('font', name, size), lambda: pygame.font.SysFont(name, size), measure
+    )
+
+
+def font_file(path, size):
+    """Return the shared Font loaded from the font file at path."""
+
+    def measure(_):
+        # pygame finds its own default font by bare file name.
+        found = path
+        if not os.path.exists(found):
+            found = os.path.join(os.path.dirname(pygame.__file__), path)
+        return os.path.getsize(found) if os.path.exists(found) else 0
+
+    return _load(
+        ('font file', path, size),
+        lambda: pygame.font.Font(path, size),
+        measure,
+    )
+
+
+def image(path, convert=True):
+    """Return the shared Surface for the image at path.
+
+    The image is converted to the display's pixel format unless convert is
+    False, so it needs a display mode to be set first.
+    """
+
+    def loader():
+        try:
+            surface = pygame.image.load(path)
+        except pygame.error as pygame_error:
+            raise SystemExit(
+                f'Failed load "{path}" {pygame.get_error()}'
+            ) from pygame_error
+        return surface.convert() if convert else surface
+
+    return _load(
+        ('image', path, convert),
+        loader,
+        lambda s: s.get_pitch() * s.get_height(),
+    )
+
+
+def report():
+    """Return (key, load seconds, bytes) for every asset loaded so far."""
+    return [
+        (key, seconds, size) for key, (_, seconds, size) in _registry.items()
+    ]
+
+
+def print_report():
+    """Print how long each asset took to load and how much memory it uses."""
+    print('Assets:')
+    for key, seconds, size in report():
+        label = ' '.join(
+            os.path.basename(part) if isinstance(part, str) else str(part)
+            for part in key
+        )
+        print(f'  {label}: {seconds * 1000:.2f} ms, {size / 1024:.1f} KiB')
@@ -0,0 +1,79 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file audio.py, which decides which collisions get a bounce
+# sound so that busy scenes do not flood the mixer
+#
+
+"""Per-frame scheduling of collision sounds."""
+
+import numpy as np
+import pygame
+from game import assets
+
+
+class SoundScheduler:
+    """Turns each frame's collisions into a few bounce sounds.
+
+    The physics reports its colliding pairs every step. A pair makes a
+    sound only on the step it starts touching, not on every step it stays
+    in contact, and no more than max_voices sounds start each frame, picked
+    at random when there are more so no balls are always left out. They
+    are all started together once the frame's physics is done.
+    """
+
+    def __init__(self, path, max_voices=8):
+        """Play the sound file at path, at most max_voices a frame."""
+        self._path = path
+        self.max_voices = max_voices
+        self._touching = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._rng = np.random.default_rng()
+
+    @staticmethod
+    def _keys(first, second):
+        """Return one int64 key for each (first, second) pair."""
+        return (first.astype(np.int64) << 32) | second.astype(np.int64)
+
+    def collide(self, first, second):
+        """Note the pairs colliding this step; new ones will make a sound."""
+        keys = self._keys(first, second)
+        new = keys[~np.isin(keys, self._touching)]
+        self._touching = keys
+        if len(new):
+            self._pending.append(new)
+
+    def play(self, volume_of):
+        """Start the sounds noted since the last call; return how many.
+
+        volume_of(index) gives the volume for a pair led by ball index. It is
+        set on each voice's channel, since the sound's own volume would
+        change every voice of it already playing.
+        """
+        if not self._pending:
+            return 0
+        keys = np.unique(np.concatenate(self._pending))
+        self._pending.clear()
+        if len(keys) > self.max_voices:
+            keys = self._rng.choice(keys, self.max_voices, replace=False)
+        if not pygame.mixer.get_init():
+            return 0
+        sound = assets.sound(self._path)
+        sound.set_volume(1.0)
+        started = 0
+        for key in keys.tolist():
+            volume = volume_of(key >> 32)
+            if volume <= 0:
+                continue
+            channel = sound.play()
+            if channel is None:
+                # Every channel is busy.
+                break
+            channel.set_volume(volume)
+            started += 1
+        return started
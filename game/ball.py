@@ -16,8 +16,9 @@
 import os.path
 from random import randint
 import pygame
-from game import rgbcolors
+from game import assets, rgbcolors
 from game.animation import Explosion
+from game.physics import BallSystem
 
 
 def random_velocity(min_val=1, max_val=5):
@@ -36,6 +37,18 @@ def random_color():
     return pygame.Color(randint(0, 255), randint(0, 255), randint(0, 255))
 
 
+def random_velocities(count, rng, min_val=1, max_val=5):
+    """Return count random velocities like random_velocity, as an array."""
+    speeds = rng.integers(min_val, max_val, size=(count, 2), endpoint=True)
+    signs = rng.choice((-1, 1), size=(count, 2))
+    return (speeds * signs).astype(float)
+
+
+def random_colors(count, rng):
+    """Return count random colors as a (count, 3) array."""
+    return rng.integers(0, 255, size=(count, 3), endpoint=True)
+
+
 # This is the class we discussed in class. You can have this as a standalone
 # definition of a circle's geometry or you can fold the Circle and Ball classes
 # together into a single class definition. Your choice.
@@ -45,6 +58,8 @@ class Circle:
     def __init__(self, center_x, center_y, radius):
         self._center = pygame.Vector2(center_x, center_y)
         self._radius = radius
+        # Built on first use and dropped whenever the center moves.
+        self._rect = None
 
     @property
     def radius(self):
@@ -58,44 +73,93 @@ class Circle:
 
     @property
     def rect(self):
-        """Return bounding Rect; calculate it and create a new Rect instance"""
-        left = self._center[0] - self._radius
-        top = self._center[1] - self._radius
-        return pygame.Rect(left, top, self.width, self.width)
+        """Return bounding Rect, built again only after the circle moves."""
+        if self._rect is None:
+            left = self._center.x - self._radius
+            top = self._center.y - self._radius
+            self._rect = pygame.Rect(left, top, self.width, self.width)
+        return self._rect
 
     @property
     def width(self):
         """Return the width of the bounding box the circle is in."""
-        return self._radius * 2
+        return self.radius * 2
 
     @property
     def height(self):
         """Return the height of the bounding box the circle is in."""
-        return self._radius * 2
+        return self.radius * 2
 
     def squared_distance_from(self, other_circle):
         """Squared distance from self to other circle."""
-        return (other_circle.center - self._center).squared_length()
+        return self.center.distance_squared_to(other_circle.center)
 
     def distance_from(self, other_circle):
         """Distance from self to other circle"""
-        return (other_circle.center - self._center).length()
+        return self.center.distance_to(other_circle.center)
 
     def move_ip(self, x_dist, y_dist):
         """Move circle in place, update the circle's center"""
-        self._center = self._center + pygame.Vector2(x_dist, y_dist)
+        self._center.x += x_dist
+        self._center.y += y_dist
+        self._rect = None
 
     def move(self, x_dist, y_dist):
         """Move circle, return a new Circle instance"""
-        center = self._center + pygame.Vector2(x_dist, y_dist)
-        return Circle(center[0], center[1], self._radius)
+        center = self.center + pygame.Vector2(x_dist, y_dist)
+        return Circle(center[0], center[1], self.radius)
 
     def stay_in_bounds(self, xmin, xmax, ymin, ymax):
         """Update position to stay within bounds"""
 
 
+class CircleView(Circle):
+    """A Circle whose center and radius are one row of a BallSystem.
+
+    The system's arrays are moved by the vectorized physics as well as
+    through the view, so nothing is cached; the row is read each time with
+    item, which makes no temporary arrays.
+    """
+
+    def __init__(self, system, index):
+        # pylint: disable=super-init-not-called
+        self._system = system
+        self._index = index
+
+    @property
+    def radius(self):
+        """Return the circle's radius"""
+        return self._system.radii.item(self._index)
+
+    @property
+    def center(self):
+        """Return a copy of the circle's center."""
+        positions = self._system.positions
+        return pygame.Vector2(
+            positions.item(self._index, 0), positions.item(self._index, 1)
+        )
+
+    @property
+    def rect(self):
+        """Return bounding Rect; calculate it from the row every time."""
+        positions = self._system.positions
+        radius = self._system.radii.item(self._index)
+        return pygame.Rect(
+            positions.item(self._index, 0) - radius,
+            positions.item(self._index, 1) - radius,
+            radius * 2,
+            radius * 2,
+        )
+
+    def move_ip(self, x_dist, y_dist):
+        """Move circle in place, update the row in the ball system"""
+        row = self._system.positions[self._index]
+        row[0] += x_dist
+        row[1] += y_dist
+
+
 class Ball:
-    """A class representing a moving ball."""
+    """A moving ball; a thin view onto one row of a BallSystem."""
 
     default_radius = 25
 
@@ -108,110 +172,152 @@ class Ball:
     bounce_sound = os.path.join(data_dir, 'Boing.aiff')
     reflect_sound = os.path.join(data_dir, 'Monkey.aiff')
 
-    def __init__(self, name, center_x, center_y, sound_on=True):
-        """Initialize a bouncing ball."""
+    def __init__(self, name, center_x, center_y, sound_on=True, system=None):
+        """Initialize a bouncing ball, stored in system if one is given."""
         # The name can be any string. The best choice is an integer.
         self._name = name
-        # Yes, we could define the details about our geometry in the Ball
-        # class or we can define the geometry in an instance variable.
-        # It is up to you if you want to separate them out or integrate them
-        # together.
-        self._circle = Circle(center_x, center_y, Ball.default_radius)
-        self._color = random_color()
-        self._velocity = random_velocity()
+        # A ball on its own keeps its state in a private one-row system.
+        if system is None:
+            system = BallSystem(1)
+        color = random_color()
+        velocity = random_velocity()
+        index = system.add(
+            (center_x, center_y),
+            velocity,
+            Ball.default_radius,
+            color,
+            randint(5, 10),
+        )
+        self._attach(system, index, sound_on)
+
+    @classmethod
+    def view(cls, system, index, sound_on=True):
+        """Return a Ball for a row that is already in system, named index."""
+        ball = cls.__new__(cls)
+        ball._name = index
+        ball._attach(system, index, sound_on)
+        return ball
+
+    def _attach(self, system, index, sound_on):
+        """Point the ball at row index of system."""
+        self._system = system
+        self._index = index
+        self._circle = CircleView(system, index)
         self._sound_on = sound_on
-        self._bounce_count = randint(5, 10)
-        self._is_alive = True
         self._draw_text = False
-        font = pygame.font.SysFont(None, Ball.default_radius)
-        self._name_text = font.render(str(self._name), True, rgbcolors.BLACK)
-
-        self._collisions = 0
-        try:
-            self._bounce_sound = pygame.mixer.Sound(Ball.bounce_sound)
-            self._bounce_channel = pygame.mixer.Channel(2)
-        except pygame.error as pygame_error:
-            print(f'Cannot open {Ball.bounce_sound}')
-            raise SystemExit(1) from pygame_error
-        try:
-            self._reflect_sound = pygame.mixer.Sound(Ball.reflect_sound)
-            self._reflect_channel = pygame.mixer.Channel(3)
-        except pygame.error as pygame_error:
-            print(f'Cannot open {Ball.reflect_sound}')
-            raise SystemExit(1) from pygame_error
+        self._name_text = None
 
     def toggle_draw_text(self):
         """Toggle the debugging text where each circle's name is drawn."""
         self._draw_text = not self._draw_text
 
-    def draw(self, surface):
-        """Draw the circle to the surface."""
-        pygame.draw.circle(surface, self.color, self.center, self.radius)
-        if self._draw_text:
-            surface.blit(
-                self._name_text,
-                self._name_text.get_rect(center=self._circle.center),
+    def is_drawing_text(self):
+        """Return true if the ball's name is drawn on it."""
+        return self._draw_text
+
+    def draw(self, surface, center=None):
+        """Draw the circle to the surface, at center if one is given.
+
+        Return the Rect of the pixels that were drawn.
+        """
+        if center is None:
+            center = self._circle.center
+        drawn = pygame.draw.circle(surface, self.color, center, self.radius)
+        name_rect = self.draw_name(surface, center)
+        if name_rect:
+            drawn = drawn.union(name_rect)
+        return drawn
+
+    def draw_name(self, surface, center):
+        """Draw the ball's name at center if the debugging text is on.
+
+        Return the Rect that was drawn, or None.
+        """
+        if not self._draw_text:
+            return None
+        if self._name_text is None:
+            font = assets.font(None, Ball.default_radius)
+            self._name_text = font.render(
+                str(self._name), True, rgbcolors.BLACK
             )
+        return surface.blit(
+            self._name_text, self._name_text.get_rect(center=center)
+        )
 
     def wall_reflect(self, xmin, xmax, ymin, ymax):
         """Reflect the ball off walll, play a sound if the sound flag is on."""
-        right_side = self._circle.center[0] + self._circle.radius
-        left_side = self._circle.center[0] - self._circle.radius
-        top_side = self._circle.center[1] - self._circle.radius
-        bottom_side = self._circle.center[1] + self._circle.radius
-
+        positions = self._system.positions
+        center_x = positions.item(self._index, 0)
+        center_y = positions.item(self._index, 1)
+        radius = self._circle.radius
+        right_side = center_x + radius
+        left_side = center_x - radius
+        top_side = center_y - radius
+        bottom_side = center_y + radius
+
+        velocity = self._system.velocities[self._index]
         if right_side > xmax or left_side < xmin:
-            self._velocity[0] *= -1
+            velocity[0] *= -1
         if top_side < ymin or bottom_side > ymax:
-            self._velocity[1] *= -1
+            velocity[1] *= -1
+
+    @property
+    def bounce_volume(self):
+        """Return the bounce sound's volume, 0 if the sound flag is on."""
+        return 0.0 if self._sound_on else 0.2
+
+    def play_bounce_sound(self):
+        """Play the bounce sound, muted if the sound flag is on."""
+        # Every ball shares the same loaded sound from the asset registry.
+        bounce_sound = assets.sound(Ball.bounce_sound)
+        pygame.mixer.Sound.set_volume(bounce_sound, self.bounce_volume)
+        pygame.mixer.Sound.play(bounce_sound)
 
     def bounce(self, other_ball):
         """Bounce the ball off of another ball, play sound if not alive."""
-        if not self._sound_on:
-            pygame.mixer.Sound.set_volume(self._bounce_sound, 0.2)
-        else:
-            pygame.mixer.Sound.set_volume(self._bounce_sound, 0.0)
-        pygame.mixer.Sound.play(self._bounce_sound)
+        self.play_bounce_sound()
 
         normal = other_ball.center - self.center
-        self._velocity = self._velocity.reflect(normal)
+        self.set_velocity(*self.velocity.reflect(normal))
 
-        other_ball._collisions += 1
+        other_ball.collisions += 1
 
     def collide_with(self, other_ball):
         """Return true if self collides with other_ball."""
-        return self._circle.distance_from(other_ball._circle) <= (
-            self.radius + other_ball.radius
+        reach = self.radius + other_ball.radius
+        return (
+            self._circle.squared_distance_from(other_ball.circle)
+            <= reach * reach
         )
 
     def separate_from(self, other_ball, rect):
         """Separate a ball from the other ball so they aren't overlapping."""
         overlap_distance = (self.radius + other_ball.radius) - (
-            self._circle.distance_from(other_ball._circle)
+            self._circle.distance_from(other_ball.circle)
         )
         half_overlap_distance = 1 + overlap_distance / 2
 
-        reverse_velocity = self._velocity * -1
-        self._circle.move_ip(*(reverse_velocity * half_overlap_distance))
+        # Each ball backs up along its velocity by half_overlap_distance.
+        velocity = self.velocity
+        back_x = -velocity.x * half_overlap_distance
+        back_y = -velocity.y * half_overlap_distance
+        velocity = other_ball.velocity
+        other_back_x = -velocity.x * half_overlap_distance
+        other_back_y = -velocity.y * half_overlap_distance
+        self._circle.move_ip(back_x, back_y)
 
         if not rect.contains(self._circle.rect):
             # undo previous move_ip
-            self._circle.move_ip(
-                *(-1 * reverse_velocity * half_overlap_distance)
-            )
+            self._circle.move_ip(-back_x, -back_y)
 
             # move other_ball half_overlap_distance, gets called twice
-            reverse_velocity = other_ball._velocity * -1
-            other_ball._circle.move_ip(
-                *(reverse_velocity * half_overlap_distance)
-            )
+            other_ball.circle.move_ip(other_back_x, other_back_y)
 
-        reverse_velocity = other_ball._velocity * -1
-        other_ball._circle.move_ip(*(reverse_velocity * half_overlap_distance))
+        other_ball.circle.move_ip(other_back_x, other_back_y)
 
     def check_collision(self, other_ball, explosion_toggle, rect):
         """Actions if ball should die upon bounce"""
-        if self._collisions >= self._bounce_count:
+        if self.collisions >= self._system.bounce_counts[self._index]:
             self.separate_from(other_ball, rect)
             self.stop()
             if not explosion_toggle:
@@ -222,6 +328,11 @@ class Ball:
         """Return the ball's name."""
         return self._name
 
+    @property
+    def index(self):
+        """Return the ball's row in its BallSystem."""
+        return self._index
+
     @property
     def rect(self):
         """Return the ball's rect."""
@@ -245,16 +356,29 @@ class Ball:
     @property
     def color(self):
         """Return the color of the ball."""
-        return self._color
+        return pygame.Color(*self._system.colors[self._index].tolist())
 
     @property
     def velocity(self):
         """Return velocity of ball"""
-        return self._velocity
+        velocities = self._system.velocities
+        return pygame.Vector2(
+            velocities.item(self._index, 0), velocities.item(self._index, 1)
+        )
+
+    @property
+    def collisions(self):
+        """Return how many times the ball has been hit."""
+        return int(self._system.collisions[self._index])
+
+    @collisions.setter
+    def collisions(self, value):
+        """Set how many times the ball has been hit."""
+        self._system.collisions[self._index] = value
 
     def is_alive(self):
         """Return true if the ball is still alive."""
-        if self._is_alive:
+        if self._system.alive[self._index]:
             return True
         return False
 
@@ -267,20 +391,18 @@ class Ball:
 
     def stop(self):
         """Stop the ball from moving."""
-        self._velocity = pygame.Vector2(0, 0)
-        self._color = rgbcolors.WHITE
-        self._is_alive = False
+        self._system.stop(self._index)
 
     def set_velocity(self, x_dist=3, y_dist=3):
         """Set the ball's velocity."""
-        self._velocity[0] = x_dist
-        self._velocity[1] = y_dist
-
-        self._velocity = pygame.Vector2(x_dist, y_dist)
+        self._system.velocities[self._index] = (x_dist, y_dist)
 
     def update(self):
         """Update the ball's position"""
-        self._circle.move_ip(*self._velocity)
+        velocities = self._system.velocities
+        self._circle.move_ip(
+            velocities.item(self._index, 0), velocities.item(self._index, 1)
+        )
         self.wall_reflect(0, 800, 0, 800)
 
     def __str__(self):
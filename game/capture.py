@@ -0,0 +1,210 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file capture.py, which saves every drawn frame as a picture
+# or as raw pixels for a video encoder, doing the slow part on other threads
+#
+
+"""Frame capture to PNG sequences or raw RGB streams."""
+
+import concurrent.futures
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+import pygame
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _png_chunk(kind, data):
+    """Return a PNG chunk of type kind holding data."""
+    return (
+        struct.pack('>I', len(data))
+        + kind
+        + data
+        + struct.pack('>I', zlib.crc32(kind + data))
+    )
+
+
+def encode_png(pixels, size, level=6):
+    """Return a PNG file holding pixels, RGB bytes of a size image."""
+    width, height = size
+    # Each row starts with its filter type; 0 leaves the row as it is.
+    rows = np.zeros((height, width * 3 + 1), np.uint8)
+    rows[:, 1:] = np.frombuffer(pixels, np.uint8).reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b'IHDR', header)
+        + _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), level))
+        + _png_chunk(b'IEND', b'')
+    )
+
+
+class FrameCapture:
+    """Base class for saving the frames a game draws.
+
+    add copies the frame's pixels, which has to happen before the next frame
+    is drawn over them, and hands them to other threads. At most pending
+    frames wait to be saved; past that add waits for one to finish, so the
+    memory used stays bounded when saving is slower than drawing.
+    """
+
+    def __init__(self, frames=None, pending=16):
+        """Save up to frames frames, all of them if None."""
+        self._limit = frames
+        self._slots = threading.Semaphore(pending)
+        self._frames = 0
+        self._error = None
+
+    @property
+    def frames(self):
+        """Return how many frames have been added."""
+        return self._frames
+
+    @property
+    def done(self):
+        """Return True once the frame limit has been reached."""
+        return self._limit is not None and self._frames >= self._limit
+
+    def add(self, surface):
+        """Save a copy of what surface shows now as the next frame."""
+        if self._error is not None:
+            raise self._error
+        self._slots.acquire()  # pylint: disable=consider-using-with
+        self._save(
+            self._frames,
+            pygame.image.tostring(surface, 'RGB'),
+            surface.get_size(),
+        )
+        self._frames += 1
+
+    def _save(self, frame, pixels, size):
+        """Start saving pixels, the RGB bytes of a size frame number frame.
+
+        Once saved, or on failure, release must be called.
+        """
+        raise NotImplementedError
+
+    def release(self, error=None):
+        """Mark one frame as saved, or as failed with error."""
+        if error is not None:
+            self._error = error
+        self._slots.release()
+
+    def close(self):
+        """Wait for every frame to be saved."""
+        raise NotImplementedError
+
+
+class PngCapture(FrameCapture):
+    """Saves each frame as a numbered PNG file, encoded on a thread pool.
+
+    zlib does the compressing without holding the interpreter lock, so the
+    workers run alongside the game and each other.
+    """
+
+    def __init__(
+        self, directory, frames=None, workers=None, pending=None, level=6
+    ):
+        """Save frames to directory as frame000000.png and so on.
+
+        workers threads encode the frames, one per CPU if None, and by
+        default twice that many frames may wait to be encoded.
+        """
+        workers = workers or os.cpu_count() or 1
+        super().__init__(frames, pending or 2 * workers)
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._level = level
+        self._pool = concurrent.futures.ThreadPoolExecutor(workers)
+
+    def _save(self, frame, pixels, size):
+        path = os.path.join(self._directory, f'frame{frame:06d}.png')
+        self._pool.submit(self._write, path, pixels, size)
+
+    def _write(self, path, pixels, size):
+        """Encode and write one frame on a worker thread.
+
+        Any error is kept for add and close to raise, since the pool would
+        only keep it in a future nobody looks at.
+        """
+        error = None
+        try:
+            with open(path, 'wb') as png_file:
+                png_file.write(encode_png(pixels, size, self._level))
+        except Exception as write_error:  # pylint: disable=broad-except
+            error = write_error
+        finally:
+            self.release(error)
+
+    def close(self):
+        self._pool.shutdown()
+        print(f'Captured {self.frames} frames to {self._directory}')
+        if self._error is not None:
+            raise self._error
+
+
+class RawCapture(FrameCapture):
+    """Writes the frames one after another as raw RGB bytes.
+
+    path can be a file or a named pipe an encoder reads from, for example
+    ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x800 -r 60 -i PATH demo.mp4.
+    A single background thread does the writing, so a slow reader holds up
+    only that thread until pending frames are waiting.
+    """
+
+    def __init__(self, path, frames=None, pending=16):
+        """Write frames to the file or named pipe at path."""
+        super().__init__(frames, pending)
+        self._path = path
+        # Opening a named pipe waits for its reader, so leave that to the
+        # writer thread as well.
+        self._file = None
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_frames, daemon=True)
+        self._writer.start()
+
+    def _save(self, frame, pixels, size):
+        self._queue.put(pixels)
+
+    def _write_frames(self):
+        """Write queued frames until close sends None."""
+        try:
+            # pylint: disable-next=consider-using-with
+            self._file = open(self._path, 'wb')
+        except OSError as error:
+            self._error = error
+        while True:
+            pixels = self._queue.get()
+            if pixels is None:
+                break
+            if self._error is not None:
+                self.release()
+                continue
+            try:
+                self._file.write(pixels)
+            except OSError as error:
+                self.release(error)
+            else:
+                self.release()
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError as error:
+                self._error = error
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        print(f'Captured {self.frames} frames to {self._path}')
+        if self._error is not None:
+            raise self._error
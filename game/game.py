@@ -14,8 +14,11 @@
 
 import os
 import sys
+import time
+import zlib
+import numpy as np
 import pygame
-from game import rgbcolors
+from game import assets, rgbcolors, timing
 from game.scene import (
     EmptyPressAnyKeyScene,
     BlinkingTitle,
@@ -34,13 +37,23 @@ def display_info():
 class VideoGame:
     """Base class for creating PyGame games."""
 
+    # The most physics steps run to catch up after one slow frame.
+    max_steps_per_frame = 5
+
     def __init__(
         self,
         window_width=800,
         window_height=800,
         window_title='My Awesome Game',
+        timings_path=None,
+        capture=None,
     ):
-        """Initialize a new game with given window size and window title."""
+        """Initialize a new game with given window size and window title.
+
+        Frame timings are written to timings_path as JSON when the game
+        ends, unless it is None. If capture, a FrameCapture, is given,
+        every frame is handed to it instead of being shown.
+        """
         pygame.init()
         self._window_size = (window_width, window_height)
         self._clock = pygame.time.Clock()
@@ -55,6 +68,11 @@ class VideoGame:
         if not pygame.mixer:
             print("Warning, sound disabled")
         self._scene_graph = []
+        self._timer = timing.FrameTimer()
+        self._overlay = timing.TimingOverlay(self._timer)
+        self._show_timings = False
+        self._timings_path = timings_path
+        self._capture = capture
 
     @property
     def scene_graph(self):
@@ -68,20 +86,80 @@ class VideoGame:
         )
 
     def run(self):
-        """Run the game; the main game loop."""
+        """Run the game; the main game loop.
+
+        Each scene is updated at its fixed physics rate, however fast it is
+        drawn: the time since the last frame is banked and spent in whole
+        physics steps, and drawing is interpolated by what is left over.
+        Every phase of every frame is timed; F3 shows the timings.
+
+        When capturing, frames are a fixed time apart however long they
+        take, nothing waits for the clock and the game stops once the
+        capture has all the frames it wants.
+        """
+        timer = self._timer
+        capture = self._capture
         while not self._game_is_over:
             for scene in self.scene_graph:
                 scene.start_scene()
-                while scene.is_valid():
-                    self._clock.tick(scene.frame_rate())
+                step = 1.0 / scene.physics_rate()
+                accumulator = 0.0
+                self._clock.tick()
+                while scene.is_valid() and not (
+                    capture is not None and capture.done
+                ):
+                    timer.start()
+                    if capture is None:
+                        elapsed = self._clock.tick(scene.frame_rate()) / 1000
+                    else:
+                        elapsed = 1.0 / (
+                            scene.frame_rate() or scene.physics_rate()
+                        )
+                    timer.lap(timing.SLEEP)
+                    accumulator = min(
+                        accumulator + elapsed,
+                        VideoGame.max_steps_per_frame * step,
+                    )
                     for event in pygame.event.get():
-                        scene.process_event(event)
-                    scene.update_scene()
+                        if (
+                            event.type == pygame.KEYDOWN
+                            and event.key == pygame.K_F3
+                        ):
+                            self._show_timings = not self._show_timings
+                            scene.redraw()
+                        else:
+                            scene.process_event(event)
+                    timer.lap(timing.EVENTS)
+                    while accumulator >= step:
+                        scene.update_scene()
+                        accumulator -= step
+                    timer.lap(timing.UPDATE)
+                    scene.interpolate(accumulator / step)
                     scene.draw()
+                    timer.lap(timing.DRAW)
                     scene.render_updates()
-                    pygame.display.update()
+                    scene.end_frame()
+                    rects = scene.dirty_rects()
+                    if self._show_timings:
+                        overlay = self._overlay.draw(self._screen)
+                        if rects is not None:
+                            rects = rects + [overlay]
+                    timer.lap(timing.RENDER_UPDATES)
+                    if capture is not None:
+                        capture.add(self._screen)
+                    elif rects is None:
+                        pygame.display.update()
+                    else:
+                        pygame.display.update(rects)
+                    timer.lap(timing.DISPLAY)
+                    timer.finish()
                 scene.end_scene()
             self._game_is_over = True
+        if capture is not None:
+            capture.close()
+        if self._timings_path:
+            timer.dump(self._timings_path)
+            print(f'Saved frame timings to {self._timings_path}')
         pygame.quit()
         sys.exit(0)
 
@@ -89,14 +167,44 @@ class VideoGame:
 class BounceDemo(VideoGame):
     """Bouncing balls demo."""
 
-    def __init__(self, num_balls):
-        """Init the bouncing balls demo."""
-        super().__init__(window_title='Bouncing Balls')
+    def __init__(
+        self,
+        num_balls,
+        frame_rate=60,
+        timings_path=None,
+        capture=None,
+        **scene_options,
+    ):
+        """Init the bouncing balls demo.
+
+        scene_options, such as broadphase, seed or snapshot_path, are handed
+        unchanged to the BouncingBallsScene as keyword arguments. With
+        capture, only that scene is run and its frames are captured rather
+        than shown.
+        """
+        super().__init__(
+            window_title='Bouncing Balls',
+            timings_path=timings_path,
+            capture=capture,
+        )
         self._main_dir = os.path.split(os.path.abspath(__file__))[0]
         self._data_dir = os.path.join(self._main_dir, 'data')
         print(f"Our main directory is {self._main_dir}")
         print(f"Our data directory is {self._data_dir}")
         self._num_balls = num_balls
+        self._frame_rate = frame_rate
+        self._scene_options = scene_options
+
+    def _balls_scene(self, frame_rate, soundtrack=None):
+        """Return the bouncing balls scene with the demo's settings."""
+        return BouncingBallsScene(
+            self._num_balls,
+            self._screen,
+            rgbcolors.BLACK,
+            frame_rate,
+            soundtrack,
+            **self._scene_options,
+        )
 
     def build_scene_graph(self):
         """Bouncing balls scene graph."""
@@ -112,6 +220,10 @@ class BounceDemo(VideoGame):
             'Good Waves", Deep Lake Records. Images: '
             'explosion1.gif from Pygame.'
         )
+        if self._capture is not None:
+            # The title and credits wait for key presses that never come.
+            self._scene_graph = [self._balls_scene(self._frame_rate)]
+            return
         self._scene_graph = [
             BlinkingTitle(
                 self._screen,
@@ -121,8 +233,56 @@ class BounceDemo(VideoGame):
                 rgbcolors.YELLOW,
                 soundtrack,
             ),
-            BouncingBallsScene(
-                self._num_balls, self._screen, rgbcolors.BLACK, 60, soundtrack
-            ),
+            self._balls_scene(self._frame_rate, soundtrack),
             SplashScene(self._screen, credits_string, soundtrack),
         ]
+
+    def run_headless(self, frames):
+        """Step only the bouncing balls, with no frame cap, and print timings.
+
+        The title and credits scenes are skipped and nothing is drawn, so
+        this measures the physics on machines without a display. A replay
+        is played up to frames steps, or until its run ended.
+        """
+        scene = self._balls_scene(0)
+        scene.start_scene()
+        system = scene.system
+        update_times = np.zeros(frames)
+        all_dead = None
+        start = time.perf_counter()
+        for frame in range(frames):
+            before = time.perf_counter()
+            scene.update_scene()
+            after = time.perf_counter()
+            # Each step stands in for a frame, for profiling windows.
+            scene.end_frame()
+            update_times[frame] = after - before
+            if all_dead is None and not system.alive.any():
+                all_dead = (frame + 1, after - start)
+            if not scene.is_valid():
+                frames = frame + 1
+                update_times = update_times[:frames]
+                break
+        elapsed = time.perf_counter() - start
+        scene.end_scene()
+
+        print(
+            f'Stepped {len(system)} balls {frames} times in {elapsed:.3f} s '
+            f'({frames / elapsed:.1f} steps/sec)'
+        )
+        if frames:
+            print(
+                f'Update time: mean {update_times.mean() * 1000:.3f} ms, '
+                f'p99 {np.percentile(update_times, 99) * 1000:.3f} ms'
+            )
+        print(f'Collisions: {system.total_collisions}')
+        # Runs of the same seed and replay end in the same state, so this
+        # shows whether two builds did the same work.
+        print(f'State checksum: {zlib.crc32(system.positions.tobytes()):08x}')
+        if all_dead:
+            print(f'All balls dead after {all_dead[0]} steps '
+                  f'({all_dead[1]:.3f} s)')
+        else:
+            print(f'Balls still alive: {int(system.alive.sum())}')
+        assets.print_report()
+        pygame.quit()
@@ -0,0 +1,402 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file parallel.py, which keeps the balls in shared memory and
+# steps each vertical strip of the world in its own worker process
+#
+
+"""Strip-decomposed physics run on a pool of worker processes."""
+
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+import numpy as np
+from game import rgbcolors
+from game.physics import BallSystem, grid_pairs
+
+# Columns start on a multiple of this many bytes in the shared block.
+ALIGNMENT = 64
+
+# Contacts a ball's collisions depend on, one after another: separating,
+# bouncing and pushing off dying balls each reach one ball further. A
+# ghost band this many diameters wide makes every strip's own balls come
+# out exactly as they would in one process.
+GHOST_DIAMETERS = 4
+
+# Maps a shared memory block's name to the block, in each worker process.
+_attached = {}
+
+
+def _arrays(layout):
+    """Return the arrays of the system layout describes, by column name."""
+    name, columns = layout
+    shared = _attached.get(name)
+    if shared is None:
+        # The block is replaced when the balls outgrow it; let the old go.
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        shared = shared_memory.SharedMemory(name=name)
+        _attached[name] = shared
+    return {
+        column: np.ndarray(shape, dtype, buffer=shared.buf, offset=offset)
+        for column, dtype, shape, offset in columns
+    }
+
+
+def _strip_of(x, left, width, strips):
+    """Return the strip each x falls in; the end strips take the rest."""
+    return np.clip((x - left) // width, 0, strips - 1).astype(np.int16)
+
+
+def _integrate(task):
+    """Move one strip's balls and bounce them off the walls.
+
+    Every row is the strip's own, so this writes them in place, and then
+    notes which strip each ball is in now. Return how many changed strip.
+    """
+    layout, start, stop, step, rect, strips = task
+    arrays = _arrays(layout)
+    rows = arrays['_order'][start:stop]
+    positions = arrays['_positions'][rows]
+    velocities = arrays['_velocities'][rows]
+    radii = arrays['_radii'][rows]
+    arrays['_previous'][rows] = positions
+    # As BallSystem.update and wall_reflect do.
+    positions += velocities * step
+    out_x = (positions[:, 0] + radii > rect.right) | (
+        positions[:, 0] - radii < rect.left
+    )
+    out_y = (positions[:, 1] - radii < rect.top) | (
+        positions[:, 1] + radii > rect.bottom
+    )
+    velocities[out_x, 0] *= -1
+    velocities[out_y, 1] *= -1
+    arrays['_positions'][rows] = positions
+    arrays['_velocities'][rows] = velocities
+    strip = _strip_of(positions[:, 0], rect.left, rect.width / strips, strips)
+    moved = int(np.count_nonzero(strip != arrays['_strips'][rows]))
+    arrays['_strips'][rows] = strip
+    return moved
+
+
+def _collide(task):
+    """Resolve the collisions of one strip's balls.
+
+    The strip's balls and every ball within the ghost band of them are
+    copied into a BallSystem of their own, in index order, and resolved
+    there as the whole system would be. Only the strip's own rows are
+    written back, into the spare buffers, as the other strips are still
+    reading the current ones. Return the pairs led by the strip's balls,
+    the strip's exploded balls and whether any pair was resolved.
+    """
+    layout, strip, bounds, band, cell_size, rect = task
+    arrays = _arrays(layout)
+    order = arrays['_order']
+    positions = arrays['_positions']
+    empty = np.empty(0, dtype=np.intp)
+    own = order[bounds[strip]:bounds[strip + 1]]
+    if not len(own):
+        return empty, empty, empty, False
+    x = positions[own, 0]
+    low, high = x.min() - band, x.max() + band
+    parts = [own]
+    for other in (range(strip - 1, -1, -1), range(strip + 1, len(bounds) - 1)):
+        for near in other:
+            rows = order[bounds[near]:bounds[near + 1]]
+            if not len(rows):
+                continue
+            x = positions[rows, 0]
+            inside = (x >= low) & (x <= high)
+            if not inside.any():
+                break
+            parts.append(rows[inside])
+    rows = np.sort(np.concatenate(parts))
+
+    local = BallSystem(len(rows))
+    local.spawn(
+        positions[rows],
+        arrays['_velocities'][rows],
+        arrays['_radii'][rows],
+        arrays['_colors'][rows],
+        arrays['_bounce_counts'][rows],
+    )
+    local.collisions[:] = arrays['_collisions'][rows]
+    local.alive[:] = arrays['_alive'][rows]
+    first, second = grid_pairs(local.positions, local.radii, cell_size)
+    # Two dead balls never collide.
+    live = local.alive[first] | local.alive[second]
+    first, second = first[live], second[live]
+    hits = local.touching(first, second)
+    first, second = first[hits], second[hits]
+    first, second = np.minimum(first, second), np.maximum(first, second)
+    order = np.lexsort((second, first))
+    first, second, exploded = local.resolve(
+        first[order], second[order], rect
+    )
+
+    is_own = arrays['_strips'][rows] == strip
+    own = rows[is_own]
+    arrays['_next_positions'][own] = local.positions[is_own]
+    arrays['_next_velocities'][own] = local.velocities[is_own]
+    arrays['_next_collisions'][own] = local.collisions[is_own]
+    # Each pair is reported by the strip of its lower index.
+    led = is_own[first]
+    return (
+        rows[first[led]],
+        rows[second[led]],
+        rows[exploded[is_own[exploded]]],
+        bool(len(first)),
+    )
+
+
+def _clamp(task):
+    """Pull one strip's balls back inside rect, as stay_in_bounds does."""
+    layout, start, stop, rect = task
+    arrays = _arrays(layout)
+    rows = arrays['_order'][start:stop]
+    positions = arrays['_positions'][rows]
+    radii = arrays['_radii'][rows]
+    np.clip(
+        positions[:, 0],
+        rect.left + radii,
+        rect.right - radii,
+        out=positions[:, 0],
+    )
+    np.clip(
+        positions[:, 1],
+        rect.top + radii,
+        rect.bottom - radii,
+        out=positions[:, 1],
+    )
+    arrays['_positions'][rows] = positions
+
+
+class StripSystem(BallSystem):
+    """BallSystem stepped strip by strip in worker processes.
+
+    Every array lives in one shared memory block that the workers attach
+    to, so no ball state is copied between processes; the tasks only
+    carry where each strip's balls are. The world is cut into vertical
+    strips, several per worker, and a step runs in two rounds. First each
+    worker moves the balls of its strips and bounces them off the walls.
+    Then the balls that changed strip are merged into their new strips,
+    and each worker resolves the collisions of its strips' balls, seeing
+    the balls in a ghost band GHOST_DIAMETERS diameters wide around them
+    too. The result is the same as a BallSystem step, bit for bit.
+
+    Balls are killed in the workers, so the index of dead balls collide
+    and sweep use is not kept. A StripSystem is only ever stepped here.
+    """
+
+    # Above the BallSystem arrays: positions, velocities and collision
+    # counts to write the collision round into, each ball's strip, and the
+    # balls sorted by strip.
+    _columns = BallSystem._columns + (
+        '_next_positions',
+        '_next_velocities',
+        '_next_collisions',
+        '_strips',
+        '_order',
+    )
+
+    # Below this many balls the pool costs more than it saves.
+    min_parallel = 20000
+
+    # More strips than workers keeps every worker busy when the balls are
+    # spread unevenly.
+    strips_per_worker = 2
+
+    def __init__(self, capacity=16, workers=None):
+        """Allocate room for capacity balls, stepped by workers processes."""
+        self._next_positions = np.zeros((0, 2))
+        self._next_velocities = np.zeros((0, 2))
+        self._next_collisions = np.zeros(0, dtype=np.int64)
+        self._strips = np.zeros(0, dtype=np.int16)
+        self._order = np.zeros(0, dtype=np.intp)
+        self._shared = None
+        self._offsets = {}
+        super().__init__(capacity)
+        self._grow(len(self._positions))
+        self._workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._bounds = None
+        self._cell_size = 0.0
+
+    @classmethod
+    def copy_of(cls, system, workers=None):
+        """Return system as a StripSystem, or system if it is too small.
+
+        With fewer than min_parallel balls or one worker, system is stepped
+        in this process as it is.
+        """
+        workers = workers or os.cpu_count() or 1
+        if len(system) < cls.min_parallel or workers < 2:
+            return system
+        strip_system = cls(len(system), workers)
+        strip_system.spawn(
+            system.positions,
+            system.velocities,
+            system.radii,
+            system.colors,
+            system.bounce_counts,
+        )
+        strip_system.collisions[:] = system.collisions
+        strip_system.alive[:] = system.alive
+        strip_system._total_collisions = system.total_collisions
+        strip_system._cell_size = 2 * system.radii.max()
+        return strip_system
+
+    def _grow(self, capacity):
+        """Move every array into a new shared block of capacity rows."""
+        columns = []
+        size = 0
+        for name in self._columns:
+            old = getattr(self, name)
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            shape = (capacity,) + old.shape[1:]
+            columns.append((name, shape, size))
+            size += int(np.prod(shape)) * old.dtype.itemsize
+        shared = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, shape, offset in columns:
+            old = getattr(self, name)
+            new = np.ndarray(
+                shape, old.dtype, buffer=shared.buf, offset=offset
+            )
+            new[: self._count] = old[: self._count]
+            setattr(self, name, new)
+            self._offsets[name] = offset
+        del old, new
+        self._release()
+        self._shared = shared
+
+    def _layout(self):
+        """Return what the workers need to find every array."""
+        return (
+            self._shared.name,
+            tuple(
+                (
+                    name,
+                    getattr(self, name).dtype.str,
+                    getattr(self, name).shape,
+                    self._offsets[name],
+                )
+                for name in self._columns
+            ),
+        )
+
+    def _merge(self, strips):
+        """Sort the balls by the strip they are in now."""
+        count = self._count
+        self._order[:count] = np.argsort(self._strips[:count], kind='stable')
+        self._bounds = np.searchsorted(
+            self._strips[self._order[:count]], np.arange(strips + 1)
+        ).tolist()
+
+    def step(self, step, rect, broadphase=None):
+        """Move every ball by step, off the walls of rect and each other.
+
+        broadphase is not used; each strip is searched with a grid.
+        Return (first, second, exploded) as collide does.
+        """
+        del broadphase
+        count = self._count
+        strips = self._workers * self.strips_per_worker
+        if self._pool is None:
+            # Forking would copy this process's SDL state into the
+            # workers, so they start from a fresh interpreter instead.
+            context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(self._workers)
+        if self._bounds is None:
+            self._strips[:count] = _strip_of(
+                self.positions[:, 0], rect.left, rect.width / strips, strips
+            )
+            self._merge(strips)
+        layout = self._layout()
+        bounds = self._bounds
+        moved = self._pool.map(
+            _integrate,
+            [
+                (layout, bounds[strip], bounds[strip + 1], step, rect, strips)
+                for strip in range(strips)
+            ],
+        )
+        if sum(moved):
+            self._merge(strips)
+            bounds = self._bounds
+        results = self._pool.map(
+            _collide,
+            [
+                (
+                    layout,
+                    strip,
+                    bounds,
+                    GHOST_DIAMETERS * self._cell_size,
+                    self._cell_size,
+                    rect,
+                )
+                for strip in range(strips)
+            ],
+        )
+        for name in ('_positions', '_velocities', '_collisions'):
+            spare = '_next' + name
+            current = getattr(self, name)
+            setattr(self, name, getattr(self, spare))
+            setattr(self, spare, current)
+            self._offsets[name], self._offsets[spare] = (
+                self._offsets[spare],
+                self._offsets[name],
+            )
+        resolved = [result[3] for result in results]
+        if any(resolved) and not all(resolved):
+            # One process only pulls balls back inside after resolving
+            # a collision, and then all of them.
+            layout = self._layout()
+            self._pool.map(
+                _clamp,
+                [
+                    (layout, bounds[strip], bounds[strip + 1], rect)
+                    for strip in range(strips)
+                    if not resolved[strip]
+                ],
+            )
+        first = np.concatenate([result[0] for result in results])
+        second = np.concatenate([result[1] for result in results])
+        order = np.lexsort((second, first))
+        first, second = first[order], second[order]
+        exploded = np.unique(np.concatenate([result[2] for result in results]))
+        self._total_collisions += len(first)
+        # The workers stopped the dying balls; mark them dead here.
+        self._alive[exploded] = False
+        self._colors[exploded] = rgbcolors.WHITE
+        return first, second, exploded
+
+    def _release(self):
+        """Free the shared memory block, if there is one."""
+        if self._shared is not None:
+            self._shared.unlink()
+            try:
+                self._shared.close()
+            except BufferError:
+                # Arrays still viewing the block keep it mapped until
+                # they are gone; its name is freed already.
+                pass
+            self._shared = None
+
+    def close(self):
+        """Stop the workers and move the balls into this process's memory.
+
+        The system can still be read and saved, but not stepped again.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        for name in self._columns:
+            setattr(self, name, np.array(getattr(self, name)))
+        self._release()
@@ -0,0 +1,807 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file physics.py, which stores the state of every ball in
+# contiguous arrays and moves, reflects and collides them all at once
+#
+
+"""Structure-of-arrays ball storage with whole-array physics."""
+
+import numpy as np
+from game import rgbcolors
+
+
+class BallSystem:
+    """Positions, velocities, radii, colors and counters of many balls.
+
+    Each attribute is one NumPy array with a row per ball, so the physics
+    step is a handful of array operations instead of a Python loop.
+    """
+
+    # The arrays with a row per ball, reallocated together as they grow.
+    _columns = (
+        '_positions',
+        '_velocities',
+        '_radii',
+        '_colors',
+        '_bounce_counts',
+        '_collisions',
+        '_alive',
+        '_previous',
+    )
+
+    def __init__(self, capacity=16):
+        """Allocate room for capacity balls; the arrays grow as needed."""
+        capacity = max(int(capacity), 1)
+        self._count = 0
+        self._total_collisions = 0
+        self._positions = np.zeros((capacity, 2))
+        self._velocities = np.zeros((capacity, 2))
+        self._radii = np.zeros(capacity)
+        self._colors = np.zeros((capacity, 3), dtype=np.uint8)
+        self._bounce_counts = np.zeros(capacity, dtype=np.int64)
+        self._collisions = np.zeros(capacity, dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._previous = np.zeros((capacity, 2))
+        # Dead balls never move again, so they are indexed once, as they die.
+        self._static = None
+
+    def __len__(self):
+        """Return the number of balls in the system."""
+        return self._count
+
+    @property
+    def positions(self):
+        """Return the (N, 2) array of ball centers."""
+        return self._positions[: self._count]
+
+    @property
+    def velocities(self):
+        """Return the (N, 2) array of ball velocities."""
+        return self._velocities[: self._count]
+
+    @property
+    def radii(self):
+        """Return the (N,) array of ball radii."""
+        return self._radii[: self._count]
+
+    @property
+    def colors(self):
+        """Return the (N, 3) array of ball colors."""
+        return self._colors[: self._count]
+
+    @property
+    def bounce_counts(self):
+        """Return how many collisions each ball survives."""
+        return self._bounce_counts[: self._count]
+
+    @property
+    def collisions(self):
+        """Return how many collisions each ball has had."""
+        return self._collisions[: self._count]
+
+    @property
+    def alive(self):
+        """Return the (N,) array of alive flags."""
+        return self._alive[: self._count]
+
+    @property
+    def total_collisions(self):
+        """Return how many colliding pairs have been resolved so far."""
+        return self._total_collisions
+
+    def _grow(self, capacity):
+        """Reallocate every array so it holds at least capacity rows."""
+        for name in self._columns:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self._count] = old[: self._count]
+            setattr(self, name, new)
+
+    def add(self, center, velocity, radius, color, bounce_count):
+        """Add a ball and return the index of its row."""
+        if self._count == len(self._positions):
+            self._grow(2 * len(self._positions))
+        index = self._count
+        self._positions[index] = center
+        self._previous[index] = center
+        self._velocities[index] = velocity
+        self._radii[index] = radius
+        self._colors[index] = tuple(color)[:3]
+        self._bounce_counts[index] = bounce_count
+        self._collisions[index] = 0
+        self._alive[index] = True
+        self._count += 1
+        return index
+
+    def spawn(self, centers, velocities, radii, colors, bounce_counts):
+        """Add one ball per row of the arguments; return the new indices."""
+        count = len(centers)
+        first = self._count
+        if first + count > len(self._positions):
+            self._grow(max(first + count, 2 * len(self._positions)))
+        rows = slice(first, first + count)
+        self._positions[rows] = centers
+        self._previous[rows] = centers
+        self._velocities[rows] = velocities
+        self._radii[rows] = radii
+        self._colors[rows] = colors
+        self._bounce_counts[rows] = bounce_counts
+        self._collisions[rows] = 0
+        self._alive[rows] = True
+        self._count += count
+        return np.arange(first, first + count)
+
+    @classmethod
+    def from_columns(
+        cls,
+        positions,
+        velocities,
+        radii,
+        colors,
+        bounce_counts,
+        collisions,
+        alive,
+        total_collisions=0,
+    ):
+        """Return a system that uses the given arrays as its own storage.
+
+        The arrays are not copied, so memory-mapped ones stay mapped until
+        the system grows. The dead balls are put in the static index.
+        """
+        system = cls(1)
+        system._positions = positions
+        system._velocities = velocities
+        system._radii = radii
+        system._colors = colors
+        system._bounce_counts = bounce_counts
+        system._collisions = collisions
+        system._alive = alive
+        system._previous = np.array(positions, dtype=float)
+        system._count = len(positions)
+        system._total_collisions = int(total_collisions)
+        dead = np.flatnonzero(~system.alive)
+        if len(dead):
+            system._static = StaticIndex(2 * system.radii.max())
+            system._static.add(
+                dead, system.positions[dead], system.radii[dead]
+            )
+        return system
+
+    def close(self):
+        """Free what the system holds besides its arrays; here nothing."""
+
+    def step(self, step, rect, broadphase=None):
+        """Move every ball by step, off the walls of rect and each other.
+
+        Return (first, second, exploded) as collide does.
+        """
+        self.update(step)
+        self.wall_reflect(rect.left, rect.right, rect.top, rect.bottom)
+        return self.collide(rect, broadphase)
+
+    def update(self, step=1.0):
+        """Move every ball by its velocity times step.
+
+        Velocities are in pixels per 1/60 of a second, so step is 1.0 when
+        physics runs at 60 Hz. The old positions are kept for interpolate.
+        """
+        positions = self.positions
+        self._previous[: self._count] = positions
+        positions += self.velocities * step
+
+    def interpolate(self, alpha):
+        """Return the centers alpha of the way from the last step to now."""
+        previous = self._previous[: self._count]
+        return previous + (self.positions - previous) * alpha
+
+    def wall_reflect(self, xmin, xmax, ymin, ymax):
+        """Flip the velocity component of every ball outside the walls."""
+        positions = self.positions
+        radii = self.radii
+        out_x = (positions[:, 0] + radii > xmax) | (
+            positions[:, 0] - radii < xmin
+        )
+        out_y = (positions[:, 1] - radii < ymin) | (
+            positions[:, 1] + radii > ymax
+        )
+        self.velocities[out_x, 0] *= -1
+        self.velocities[out_y, 1] *= -1
+
+    def touching(self, first, second):
+        """Return a mask of the (first, second) pairs that overlap."""
+        delta = self._positions[second] - self._positions[first]
+        reach = self._radii[first] + self._radii[second]
+        return np.einsum('ij,ij->i', delta, delta) <= reach * reach
+
+    def collision_pairs(self, block_size=2048, indices=None):
+        """Return every overlapping pair (i < j) by testing all pairs.
+
+        Only the balls in indices are tested, all of them if it is None.
+        Rows are compared in blocks so memory stays bounded by
+        block_size * N no matter how many balls there are.
+        """
+        positions = self.positions
+        radii = self.radii
+        if indices is not None:
+            positions = positions[indices]
+            radii = radii[indices]
+        count = len(positions)
+        firsts = [np.empty(0, dtype=np.intp)]
+        seconds = [np.empty(0, dtype=np.intp)]
+        for start in range(0, count, block_size):
+            stop = min(start + block_size, count)
+            delta = positions[None, start:] - positions[start:stop, None]
+            squared = np.einsum('ijk,ijk->ij', delta, delta)
+            reach = radii[start:stop, None] + radii[None, start:]
+            hits = np.triu(squared <= reach * reach, 1)
+            rows, cols = np.nonzero(hits)
+            firsts.append(rows + start)
+            seconds.append(cols + start)
+        first, second = np.concatenate(firsts), np.concatenate(seconds)
+        if indices is not None:
+            return indices[first], indices[second]
+        return first, second
+
+    def separate(self, first, second, rect):
+        """Push each first ball back off its second ball, like separate_from.
+
+        Every first ball backs up along its own velocity by half the overlap.
+        If that would leave it outside rect the second ball backs up twice
+        as far instead.
+        """
+        positions = self._positions
+        velocities = self._velocities
+        delta = positions[second] - positions[first]
+        distance = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        overlap = (self._radii[first] + self._radii[second]) - distance
+        half_overlap = (1 + overlap / 2)[:, None]
+
+        first_move = -velocities[first] * half_overlap
+        moved = positions[first] + first_move
+        radius = self._radii[first]
+        inside = (
+            (moved[:, 0] - radius >= rect.left)
+            & (moved[:, 0] + radius <= rect.right)
+            & (moved[:, 1] - radius >= rect.top)
+            & (moved[:, 1] + radius <= rect.bottom)
+        )
+        second_move = -velocities[second] * half_overlap
+        second_move[~inside] *= 2
+        np.add.at(positions, first, first_move * inside[:, None])
+        np.add.at(positions, second, second_move)
+
+    def bounce(self, first, second):
+        """Reflect every ball in a pair about the line to the other ball.
+
+        A ball touching several others is reflected once, about the sum of
+        the directions to all of them, so its speed never changes.
+        """
+        normal = self._positions[second] - self._positions[first]
+        length = np.sqrt(np.einsum('ij,ij->i', normal, normal))
+        valid = length > 0
+        unit = np.zeros_like(normal)
+        unit[valid] = normal[valid] / length[valid, None]
+        normals = np.zeros((self._count, 2))
+        np.add.at(normals, first, unit)
+        np.add.at(normals, second, -unit)
+        length = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+        hit = np.flatnonzero(length > 1e-12)
+        unit = normals[hit] / length[hit, None]
+        velocities = self._velocities[hit]
+        along = np.einsum('ij,ij->i', velocities, unit)
+        self._velocities[hit] = velocities - 2 * along[:, None] * unit
+        np.add.at(self._collisions, first, 1)
+        np.add.at(self._collisions, second, 1)
+
+    def stay_in_bounds(self, rect):
+        """Pull any ball pushed through a wall back inside rect."""
+        positions = self.positions
+        radii = self.radii
+        np.clip(
+            positions[:, 0],
+            rect.left + radii,
+            rect.right - radii,
+            out=positions[:, 0],
+        )
+        np.clip(
+            positions[:, 1],
+            rect.top + radii,
+            rect.bottom - radii,
+            out=positions[:, 1],
+        )
+
+    @property
+    def quiescent(self):
+        """Return True once every ball is dead and nothing can move."""
+        return not self.alive.any()
+
+    def settle(self):
+        """Forget the last step's motion, so interpolate gives positions."""
+        self._previous[: self._count] = self.positions
+
+    def stop(self, indices):
+        """Stop the given balls, turn them white and mark them dead.
+
+        Balls that were alive are added to the static index of dead balls.
+        """
+        indices = np.atleast_1d(indices)
+        indices = indices[self._alive[indices]]
+        self._velocities[indices] = 0
+        self._colors[indices] = rgbcolors.WHITE
+        self._alive[indices] = False
+        if len(indices):
+            if self._static is None:
+                self._static = StaticIndex(2 * self.radii.max())
+            self._static.add(
+                indices, self._positions[indices], self._radii[indices]
+            )
+
+    def _static_pairs(self, indices, radii):
+        """Return (ball, dead ball) for every dead ball near each ball.
+
+        radii gives how far each ball in indices reaches.
+        """
+        if self._static is None or not len(indices):
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty
+        rows, dead = self._static.query(self._positions[indices], radii)
+        return indices[rows], dead
+
+    def collide(self, rect, broadphase=None):
+        """Resolve every collision among the balls.
+
+        Candidate pairs among the live balls come from broadphase, or from
+        testing every pair when it is None. Dead balls never move, so they
+        are only looked up in the static index around the live balls, and
+        two dead balls never collide. Return (first, second, exploded): the
+        colliding pairs and the indices of balls that are dead after being
+        hit this step.
+        """
+        moving = np.flatnonzero(self.alive)
+        # With no dead balls the broadphase can skip copying a subset.
+        indices = moving if len(moving) < self._count else None
+        if broadphase is None:
+            first, second = self.collision_pairs(indices=indices)
+        else:
+            first, second = broadphase.candidate_pairs(self, indices)
+        dead_first, dead_second = self._static_pairs(
+            moving, self._radii[moving]
+        )
+        first = np.concatenate((first, dead_first))
+        second = np.concatenate((second, dead_second))
+        hits = self.touching(first, second)
+        first, second = first[hits], second[hits]
+        # Put the pairs in one canonical order so every broadphase resolves
+        # the same collisions in the same sequence.
+        first, second = np.minimum(first, second), np.maximum(first, second)
+        order = np.lexsort((second, first))
+        return self.resolve(first[order], second[order], rect)
+
+    def resolve(self, first, second, rect):
+        """Separate and bounce the overlapping pairs (first, second).
+
+        The pairs must be sorted by first and then second, with first below
+        second in each. Return (first, second, exploded) as collide does.
+        """
+        if not len(first):
+            return first, second, first
+        return self._resolve(first, second, rect, True)
+
+    def _resolve(self, first, second, rect, push_apart):
+        """Bounce the colliding pairs and kill the balls hit often enough.
+
+        With push_apart the pairs are overlapping and are separated first,
+        and a dying ball is pushed off the ball that hit it. Return (first,
+        second, exploded) as collide does.
+        """
+        self._total_collisions += len(first)
+        if push_apart:
+            self.separate(first, second, rect)
+        self.bounce(first, second)
+
+        involved = np.union1d(first, second)
+        already_dead = involved[~self._alive[involved]]
+        first_dies = self._alive[first] & (
+            self._collisions[first] >= self._bounce_counts[first]
+        )
+        second_dies = self._alive[second] & (
+            self._collisions[second] >= self._bounce_counts[second]
+        )
+        if push_apart:
+            self.separate(first[first_dies], second[first_dies], rect)
+            self.separate(second[second_dies], first[second_dies], rect)
+        dying = np.union1d(first[first_dies], second[second_dies])
+        # Balls are indexed where they stop, so they must be inside first.
+        self.stay_in_bounds(rect)
+        self.stop(dying)
+        return first, second, np.union1d(already_dead, dying)
+
+    def _pair_impacts(self, first, second, step):
+        """Return when in the step each pair first touches, inf if never.
+
+        Times are fractions of a step of the given length. A pair already
+        overlapping and closing in touches at 0; one moving apart never does.
+        """
+        delta = self._positions[second] - self._positions[first]
+        closing = (self._velocities[second] - self._velocities[first]) * step
+        reach = self._radii[first] + self._radii[second]
+        # |delta + closing * t| = reach is a quadratic a t^2 + b t + c = 0.
+        a = np.einsum('ij,ij->i', closing, closing)
+        b = 2 * np.einsum('ij,ij->i', delta, closing)
+        c = np.einsum('ij,ij->i', delta, delta) - reach * reach
+        discriminant = b * b - 4 * a * c
+        hits = (b < 0) & (discriminant >= 0) & (a > 0)
+        times = np.full(len(first), np.inf)
+        times[hits] = (-b[hits] - np.sqrt(discriminant[hits])) / (
+            2 * a[hits]
+        )
+        times[hits & (c <= 0)] = 0.0
+        return times
+
+    def _wall_impacts(self, step, rect):
+        """Return when in the step each ball reaches a wall on x and on y."""
+        positions = self.positions
+        moves = self.velocities * step
+        radii = self.radii[:, None]
+        lows = np.array((rect.left, rect.top)) + radii
+        highs = np.array((rect.right, rect.bottom)) - radii
+        limits = np.where(moves > 0, highs, lows)
+        times = np.full(moves.shape, np.inf)
+        moving = moves != 0
+        times[moving] = (limits[moving] - positions[moving]) / moves[moving]
+        # A ball already through a wall and still heading out turns now.
+        return np.maximum(times, 0.0)
+
+    def sweep(self, step, rect, max_substeps=8, slop=1e-6):
+        """Move every ball by step, bouncing at the moment of each contact.
+
+        This is the continuous counterpart of update, wall_reflect and
+        collide. Every pair that could meet during the step is found up
+        front and solved for its time of impact, as is every ball against
+        the walls. The step is then cut at the earliest contact, where those
+        balls bounce, up to max_substeps times. If contacts are still ahead
+        once the sub-steps run out, every ball moves on to the earliest of
+        them and the rest of the step is dropped, so crowded scenes run
+        slower rather than letting balls overlap. Return (first, second,
+        exploded) as collide does.
+        """
+        count = self._count
+        positions = self.positions
+        velocities = self.velocities
+        self._previous[:count] = positions
+        empty = np.empty(0, dtype=np.intp)
+        if not count:
+            return empty, empty, empty
+        # Speed never changes in a bounce, so a ball stays within its reach
+        # of where it started for the whole step.
+        reach = self.radii + np.sqrt(
+            np.einsum('ij,ij->i', velocities, velocities)
+        ) * step
+        moving = np.flatnonzero(self.alive)
+        first, second = grid_pairs(positions[moving], reach[moving], 0)
+        first, second = moving[first], moving[second]
+        dead_first, dead_second = self._static_pairs(moving, reach[moving])
+        first = np.concatenate((first, dead_first))
+        second = np.concatenate((second, dead_second))
+        delta = positions[second] - positions[first]
+        near = np.einsum('ij,ij->i', delta, delta) <= (
+            reach[first] + reach[second]
+        ) ** 2
+        first, second = first[near], second[near]
+        first, second = np.minimum(first, second), np.maximum(first, second)
+        order = np.lexsort((second, first))
+        first, second = first[order], second[order]
+
+        hits = []
+        remaining = 1.0
+        for _ in range(max_substeps):
+            pair_times = self._pair_impacts(first, second, step)
+            wall_times = self._wall_impacts(step, rect)
+            # Everyone moves on to the earliest contact.
+            now = min(pair_times.min(initial=np.inf), wall_times.min())
+            if now >= remaining:
+                break
+            positions += velocities * (step * now)
+            remaining -= now
+            velocities[wall_times <= now + slop] *= -1
+            due = pair_times <= now + slop
+            hits.append(self._resolve(first[due], second[due], rect, False))
+        else:
+            # Out of sub-steps: everyone moves on to the earliest contact,
+            # bounces there and gives up the rest of the step. Stopping
+            # balls at contacts of their own would be unsound, as those
+            # times assume the other ball keeps moving.
+            pair_times = self._pair_impacts(first, second, step)
+            wall_times = self._wall_impacts(step, rect)
+            now = min(
+                pair_times.min(initial=np.inf), wall_times.min(), remaining
+            )
+            positions += velocities * (step * now)
+            velocities[wall_times <= now + slop] *= -1
+            due = pair_times <= now + slop
+            hits.append(self._resolve(first[due], second[due], rect, False))
+            remaining = 0.0
+        positions += velocities * (step * remaining)
+        self.stay_in_bounds(rect)
+        if not hits:
+            return empty, empty, empty
+        return (
+            np.concatenate([hit[0] for hit in hits]),
+            np.concatenate([hit[1] for hit in hits]),
+            np.unique(np.concatenate([hit[2] for hit in hits])),
+        )
+
+
+def _expand_ranges(start, stop):
+    """Expand half-open ranges into (owner, member) index arrays.
+
+    Entry k of start/stop contributes the pairs (k, start[k]) through
+    (k, stop[k] - 1), all without a Python loop.
+    """
+    counts = np.maximum(stop - start, 0)
+    owners = np.repeat(np.arange(len(start)), counts)
+    firsts = np.cumsum(counts) - counts
+    offsets = np.arange(counts.sum()) - np.repeat(firsts, counts)
+    return owners, np.repeat(start, counts) + offsets
+
+
+class BruteForce:
+    """Broadphase that hands every overlapping pair to the narrow phase.
+
+    This is the O(n^2) all-pairs test, kept as the reference the faster
+    broadphases are checked against.
+    """
+
+    def candidate_pairs(self, system, indices=None):
+        """Return the (first, second) pairs that may be touching.
+
+        Only the balls in indices are searched, all of them if it is None.
+        """
+        return system.collision_pairs(indices=indices)
+
+
+class SpatialHash:
+    """Uniform grid broadphase rebuilt from the ball positions every step.
+
+    Balls are bucketed into square cells at least one ball diameter wide,
+    so a ball can only touch balls in its own cell or the eight around it.
+    """
+
+    # A cell plus the four neighbours after it; every neighbouring pair of
+    # cells is then visited exactly once.
+    neighbours = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+    def __init__(self, cell_size):
+        """Use cells cell_size wide, widened if any ball is bigger."""
+        self._cell_size = cell_size
+
+    def candidate_pairs(self, system, indices=None):
+        """Return the (first, second) pairs in the same or adjacent cells."""
+        if indices is None:
+            return grid_pairs(system.positions, system.radii, self._cell_size)
+        first, second = grid_pairs(
+            system.positions[indices], system.radii[indices], self._cell_size
+        )
+        return indices[first], indices[second]
+
+
+def grid_pairs(positions, radii, cell_size):
+    """Return the (first, second) rows in the same or adjacent grid cells.
+
+    This is the SpatialHash search on bare position and radius arrays, so
+    it also works on a slice of the balls copied out of a BallSystem.
+    """
+    count = len(positions)
+    if count < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    cell_size = max(cell_size, 2 * radii.max())
+    cells = np.floor(
+        (positions - positions.min(axis=0)) / cell_size
+    ).astype(np.int64)
+    # Rows run one past the last used cell so stepping down a row never
+    # wraps into the next column.
+    stride = cells[:, 1].max() + 2
+    keys = cells[:, 0] * stride + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_cells = cells[order]
+
+    firsts = []
+    seconds = []
+    for (x_step, y_step) in SpatialHash.neighbours:
+        targets = (sorted_cells[:, 0] + x_step) * stride + (
+            sorted_cells[:, 1] + y_step
+        )
+        start = np.searchsorted(sorted_keys, targets, 'left')
+        stop = np.searchsorted(sorted_keys, targets, 'right')
+        if (x_step, y_step) == (0, 0):
+            # Within one cell only pair a ball with the ones after it.
+            start = np.arange(1, count + 1)
+        owners, members = _expand_ranges(start, stop)
+        firsts.append(order[owners])
+        seconds.append(order[members])
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+class SweepAndPrune:
+    """Sweep-and-prune broadphase along the x axis.
+
+    The balls are kept sorted by the left end of their x interval from one
+    step to the next. Balls only move a few pixels a step, so the previous
+    order is almost sorted already and re-sorting it is close to linear.
+    """
+
+    def __init__(self):
+        """Start with no remembered order."""
+        self._order = np.empty(0, dtype=np.intp)
+
+    def candidate_pairs(self, system, indices=None):
+        """Return the (first, second) pairs whose bounding boxes overlap."""
+        if indices is None:
+            indices = np.arange(len(system))
+        count = len(indices)
+        if len(self._order) != count:
+            # Drop the balls that left the search, keeping the order of the
+            # rest; start over if any are new.
+            kept = self._order[np.isin(self._order, indices)]
+            self._order = kept if len(kept) == count else indices.copy()
+        positions = system.positions
+        radii = system.radii
+        lows = positions[self._order, 0] - radii[self._order]
+        # Timsort finds the runs left over from the last step, so a nearly
+        # sorted order costs about one pass, as an insertion sort would.
+        resort = np.argsort(lows, kind='stable')
+        self._order = self._order[resort]
+        lows = lows[resort]
+        highs = positions[self._order, 0] + radii[self._order]
+
+        # Every ball after this one whose interval starts before this one
+        # ends overlaps it on x.
+        start = np.arange(1, count + 1)
+        stop = np.searchsorted(lows, highs, 'right')
+        owners, members = _expand_ranges(start, stop)
+        first = self._order[owners]
+        second = self._order[members]
+        gaps = np.abs(positions[first, 1] - positions[second, 1])
+        keep = gaps <= radii[first] + radii[second]
+        return first[keep], second[keep]
+
+
+class StaticIndex:
+    """Grid of balls that never move again, added to as they stop.
+
+    The balls are kept sorted by cell, with a dense table of where each
+    cell's balls start over the block of cells that hold any. Adding
+    balls merges them into the sorted order and counts the cells again
+    with one bincount. Finding the balls near a point reads its
+    neighboring cells straight from the table, and points with no indexed
+    ball nearby are dropped before any cell is looked up.
+    """
+
+    def __init__(self, cell_size):
+        """Use cells cell_size wide."""
+        self._cell_size = cell_size
+        # Each member's (x, y) cell, in the order of cell number.
+        self._cells = np.empty((0, 2), dtype=np.int64)
+        self._members = np.empty(0, dtype=np.intp)
+        self._max_radius = 0.0
+        # The table covers shape cells from origin; cell (x, y) is number
+        # (x - origin x) * shape y + (y - origin y).
+        self._origin = np.zeros(2, dtype=np.int64)
+        self._shape = (0, 0)
+        self._starts = np.zeros(1, dtype=np.intp)
+        self._occupied = np.zeros((0, 0), dtype=bool)
+        # Maps a span to which cells have a member within span cells.
+        self._near = {}
+
+    def __len__(self):
+        return len(self._members)
+
+    def _cells_of(self, positions):
+        """Return the (x, y) cell of each position."""
+        return np.floor(positions / self._cell_size).astype(np.int64)
+
+    def add(self, indices, positions, radii):
+        """Add the balls in indices, centered at positions."""
+        if not len(indices):
+            return
+        cells = np.concatenate((self._cells, self._cells_of(positions)))
+        members = np.concatenate((self._members, indices))
+        self._origin = cells.min(axis=0)
+        self._shape = tuple((cells.max(axis=0) + 1 - self._origin).tolist())
+        local = cells - self._origin
+        numbers = local[:, 0] * self._shape[1] + local[:, 1]
+        # The old members are in order already, so this merges two runs.
+        order = np.argsort(numbers, kind='stable')
+        self._cells = cells[order]
+        self._members = members[order]
+        counts = np.bincount(
+            numbers, minlength=self._shape[0] * self._shape[1]
+        )
+        self._starts = np.concatenate(([0], np.cumsum(counts)))
+        self._occupied = counts.reshape(self._shape) > 0
+        self._near = {}
+        self._max_radius = max(self._max_radius, float(radii.max()))
+
+    def _near_cells(self, span):
+        """Return which cells, padded by span, have a member within span.
+
+        Entry (x + span, y + span) is for the cell (x, y) from the origin.
+        """
+        near = self._near.get(span)
+        if near is None:
+            width, height = self._shape
+            near = np.zeros((width + 2 * span, height + 2 * span), bool)
+            for x_step in range(2 * span + 1):
+                for y_step in range(2 * span + 1):
+                    near[
+                        x_step : x_step + width, y_step : y_step + height
+                    ] |= self._occupied
+            self._near[span] = near
+        return near
+
+    def query(self, positions, radii):
+        """Return (row, ball) for every indexed ball that may touch a row.
+
+        Row k is a circle at positions[k] of radius radii[k].
+        """
+        empty = np.empty(0, dtype=np.intp)
+        if not len(self._members) or not len(positions):
+            return empty, empty
+        span = int(
+            np.ceil((radii.max() + self._max_radius) / self._cell_size)
+        )
+        width, height = self._shape
+        cells = self._cells_of(positions) - self._origin
+        column = cells[:, 0] + span
+        row = cells[:, 1] + span
+        rows = np.flatnonzero(
+            (column >= 0)
+            & (column < width + 2 * span)
+            & (row >= 0)
+            & (row < height + 2 * span)
+        )
+        rows = rows[self._near_cells(span)[column[rows], row[rows]]]
+        columns = cells[rows, 0]
+        cell_rows = cells[rows, 1]
+        found_rows = []
+        found_balls = []
+        for x_step in range(-span, span + 1):
+            for y_step in range(-span, span + 1):
+                column = columns + x_step
+                row = cell_rows + y_step
+                valid = (
+                    (column >= 0)
+                    & (column < width)
+                    & (row >= 0)
+                    & (row < height)
+                )
+                numbers = column[valid] * height + row[valid]
+                owners, members = _expand_ranges(
+                    self._starts[numbers], self._starts[numbers + 1]
+                )
+                found_rows.append(rows[valid][owners])
+                found_balls.append(self._members[members])
+        return np.concatenate(found_rows), np.concatenate(found_balls)
+
+
+def make_broadphase(name, cell_size):
+    """Return the broadphase called name.
+
+    name is 'grid', 'sweep', 'brute' or 'strips'. Large systems are
+    stepped strip by strip in game.parallel instead, which searches each
+    strip with a grid, so 'strips' is a grid for any that are not.
+    """
+    if name in ('grid', 'strips'):
+        return SpatialHash(cell_size)
+    if name == 'sweep':
+        return SweepAndPrune()
+    if name == 'brute':
+        return BruteForce()
+    raise ValueError(f'Unknown broadphase "{name}"')
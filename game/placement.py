@@ -0,0 +1,110 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file placement.py, which picks starting spots for the balls so
+# that no two of them overlap, however many balls there are
+#
+
+"""Grid-accelerated Poisson-disk placement of non-overlapping balls."""
+
+import math
+import numpy as np
+
+# Balls are spaced this many diameters apart, center to center.
+SPACING = 1.2
+
+# Points per min_distance squared to aim for. One pass of dart throwing
+# reaches about 0.52 and a saturated sample about 0.68, so this is usually
+# met in the first pass.
+DENSITY = 0.45
+
+
+def poisson_disk(width, height, min_distance, rng, count=None, attempts=30):
+    """Return points in width x height no closer than min_distance apart.
+
+    This is dart throwing on a background grid, in the style of Bridson:
+    cells are min_distance / sqrt(2) wide, so each holds at most one point
+    and a new point only has to be checked against the 5x5 block of cells
+    around it. Cells three apart can never conflict, so the grid is split
+    into nine phases and every empty cell in a phase throws a dart at once.
+    Passes over the grid stop early once there are count points.
+    """
+    cell = min_distance / math.sqrt(2)
+    columns = max(int(math.ceil(width / cell)), 1)
+    rows = max(int(math.ceil(height / cell)), 1)
+    # Two cells of padding on every side keep the 5x5 lookups in bounds.
+    grid = np.full((columns + 4, rows + 4, 2), np.nan)
+    squared = min_distance * min_distance
+    phases = []
+    for phase_x in range(3):
+        for phase_y in range(3):
+            cells_x, cells_y = np.meshgrid(
+                np.arange(phase_x, columns, 3),
+                np.arange(phase_y, rows, 3),
+                indexing='ij',
+            )
+            phases.append((cells_x.ravel() + 2, cells_y.ravel() + 2))
+
+    placed = 0
+    for _ in range(attempts):
+        thrown = 0
+        for cells_x, cells_y in phases:
+            empty = np.isnan(grid[cells_x, cells_y, 0])
+            cells_x = cells_x[empty]
+            cells_y = cells_y[empty]
+            if not len(cells_x):
+                continue
+            thrown += len(cells_x)
+            points = (
+                np.stack((cells_x, cells_y), axis=1)
+                - 2
+                + rng.random((len(cells_x), 2))
+            ) * cell
+            accept = (points[:, 0] < width) & (points[:, 1] < height)
+            for step_x in range(-2, 3):
+                for step_y in range(-2, 3):
+                    other = grid[cells_x + step_x, cells_y + step_y]
+                    delta = other - points
+                    # Empty cells hold NaN, which never compares as close.
+                    close = np.einsum('ij,ij->i', delta, delta) < squared
+                    accept &= ~close
+            grid[cells_x[accept], cells_y[accept]] = points[accept]
+            placed += int(accept.sum())
+        if not thrown or (count is not None and placed >= count):
+            break
+    points = grid.reshape(-1, 2)
+    return points[~np.isnan(points[:, 0])]
+
+
+def place_balls(count, rect, radius, rng):
+    """Return (radius, centers) for count non-overlapping balls in rect.
+
+    The radius starts at the given one and shrinks until count balls fit,
+    which lets far more balls than the window could hold at full size
+    start without overlapping.
+    """
+    area = rect.width * rect.height
+    if count:
+        fit = math.sqrt(area * DENSITY / count) / SPACING / 2
+        radius = min(radius, fit)
+    while True:
+        # Keep one pixel between every ball and the walls.
+        margin = radius + 1
+        points = poisson_disk(
+            rect.width - 2 * margin,
+            rect.height - 2 * margin,
+            2 * radius * SPACING,
+            rng,
+            count,
+        )
+        if len(points) >= count:
+            break
+        radius *= 0.9
+    chosen = rng.choice(len(points), size=count, replace=False)
+    centers = points[np.sort(chosen)] + (rect.left + margin, rect.top + margin)
+    return radius, centers
@@ -0,0 +1,77 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file profiling.py, which runs the Python profiler over some
+# frames of a scene and saves what it found
+#
+
+"""cProfile captures of a window of frames, saved as .pstats files."""
+
+import cProfile
+import io
+import pstats
+
+
+class FrameProfiler:
+    """Profiles everything run between two frames and saves the result.
+
+    Each capture is written to a .pstats file named for the ball count and
+    the frames it covers, and with summary also to a .txt file listing the
+    top functions by cumulative time.
+    """
+
+    def __init__(self, prefix='bounce', summary=False, top=40):
+        """Name files after prefix and list top functions in summaries."""
+        self._prefix = prefix
+        self._summary = summary
+        self._top = top
+        self._profile = None
+        self._first_frame = 0
+
+    @property
+    def active(self):
+        """Return True while a capture is running."""
+        return self._profile is not None
+
+    def start(self, frame):
+        """Start capturing at frame."""
+        if self._profile is None:
+            self._first_frame = frame
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            print(f'Profiling from frame {frame}.')
+
+    def stop(self, frame, balls):
+        """Stop capturing at frame, save the capture and return its path."""
+        if self._profile is None:
+            return None
+        self._profile.disable()
+        profile = self._profile
+        self._profile = None
+        path = (
+            f'{self._prefix}-{balls}balls-'
+            f'frames{self._first_frame}-{frame}.pstats'
+        )
+        profile.dump_stats(path)
+        print(f'Saved the profile of frames {self._first_frame}-{frame} '
+              f'to {path}')
+        if self._summary:
+            text = io.StringIO()
+            stats = pstats.Stats(profile, stream=text)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self._top)
+            summary_path = path[: -len('.pstats')] + '.txt'
+            with open(summary_path, 'w', encoding='utf-8') as summary_file:
+                summary_file.write(text.getvalue())
+        return path
+
+    def toggle(self, frame, balls):
+        """Start capturing if stopped, otherwise stop and save."""
+        if self._profile is None:
+            self.start(frame)
+        else:
+            self.stop(frame, balls)
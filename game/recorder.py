@@ -0,0 +1,170 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file recorder.py, which saves where every ball was on every
+# step of a run, writing to disk on its own thread so the game never waits
+#
+
+"""Streaming trajectory recorder with a background writer thread."""
+
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+
+MAGIC = b'BALLTRAJ'
+VERSION = 1
+
+# Magic, version, column count, ball count and steps between records.
+HEADER = struct.Struct('<8sHHQI')
+
+# Rows in a chunk, then the compressed size of each column in turn.
+CHUNK = struct.Struct('<I')
+COLUMN = struct.Struct('<Q')
+
+# Every chunk holds these columns for each of its records, in this order.
+# The shape is that of one ball's entry, or None for one entry per record.
+COLUMNS = (
+    ('steps', np.int64, None),
+    ('positions', np.float32, (2,)),
+    ('velocities', np.float32, (2,)),
+    ('alive', np.bool_, ()),
+)
+
+
+def _record_shape(shape, count):
+    """Return the shape of one record of a column for count balls."""
+    return () if shape is None else (count,) + shape
+
+
+class TrajectoryRecorder:
+    """Records every ball's position, velocity and alive flag each step.
+
+    record only copies the system's arrays into a preallocated chunk. Full
+    chunks go to a background thread, which compresses each column with
+    zlib and appends it to the file, then hands the chunk back for reuse.
+    Positions and velocities are stored as 32-bit floats.
+    """
+
+    def __init__(self, path, count, every=1, chunk_records=64, chunks=3):
+        """Record count balls to path every every steps.
+
+        Each chunk holds chunk_records records, and chunks of them are
+        allocated up front. If the writer falls that far behind, record
+        waits for it.
+        """
+        self._path = path
+        self._count = count
+        self._every = max(int(every), 1)
+        self._chunk_records = chunk_records
+        self._free = queue.Queue()
+        for _ in range(chunks):
+            self._free.put(
+                {
+                    name: np.zeros(
+                        (chunk_records,) + _record_shape(shape, count), dtype
+                    )
+                    for name, dtype, shape in COLUMNS
+                }
+            )
+        self._full = queue.Queue()
+        self._chunk = self._free.get()
+        self._rows = 0
+        self._error = None
+        self._file = open(path, 'wb')  # pylint: disable=consider-using-with
+        self._file.write(
+            HEADER.pack(MAGIC, VERSION, len(COLUMNS), count, self._every)
+        )
+        self._writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self._writer.start()
+
+    def record(self, step, system):
+        """Copy the state of system after step if it is a recorded step."""
+        if step % self._every:
+            return
+        if self._error is not None:
+            raise self._error
+        chunk = self._chunk
+        row = self._rows
+        chunk['steps'][row] = step
+        chunk['positions'][row] = system.positions
+        chunk['velocities'][row] = system.velocities
+        chunk['alive'][row] = system.alive
+        self._rows += 1
+        if self._rows == self._chunk_records:
+            self._full.put((chunk, self._rows))
+            self._chunk = self._free.get()
+            self._rows = 0
+
+    def _write_chunks(self):
+        """Compress and write full chunks until close sends None."""
+        while True:
+            item = self._full.get()
+            if item is None:
+                return
+            chunk, rows = item
+            try:
+                columns = [
+                    zlib.compress(chunk[name][:rows].tobytes(), 1)
+                    for name, _, _ in COLUMNS
+                ]
+                self._file.write(CHUNK.pack(rows))
+                for column in columns:
+                    self._file.write(COLUMN.pack(len(column)))
+                    self._file.write(column)
+            except (OSError, zlib.error) as error:
+                self._error = error
+            self._free.put(chunk)
+
+    def close(self):
+        """Write what is left, wait for the writer and close the file."""
+        if self._file.closed:
+            return
+        if self._rows:
+            self._full.put((self._chunk, self._rows))
+            self._rows = 0
+        self._full.put(None)
+        self._writer.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+
+def read(path):
+    """Return (steps, positions, velocities, alive) recorded in path.
+
+    steps has one entry per record and the other arrays one row per record
+    with a column per ball.
+    """
+    with open(path, 'rb') as trajectory_file:
+        magic, version, columns, count, _ = HEADER.unpack(
+            trajectory_file.read(HEADER.size)
+        )
+        if magic != MAGIC or version != VERSION or columns != len(COLUMNS):
+            raise ValueError(f'"{path}" is not a version {VERSION} recording')
+        parts = {name: [] for name, _, _ in COLUMNS}
+        while True:
+            head = trajectory_file.read(CHUNK.size)
+            if not head:
+                break
+            (rows,) = CHUNK.unpack(head)
+            for name, dtype, shape in COLUMNS:
+                (size,) = COLUMN.unpack(trajectory_file.read(COLUMN.size))
+                data = zlib.decompress(trajectory_file.read(size))
+                parts[name].append(
+                    np.frombuffer(data, dtype).reshape(
+                        (rows,) + _record_shape(shape, count)
+                    )
+                )
+    return tuple(
+        np.concatenate(parts[name])
+        if parts[name]
+        else np.zeros((0,) + _record_shape(shape, count), dtype)
+        for name, dtype, shape in COLUMNS
+    )
@@ -0,0 +1,176 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file render.py, which keeps ready-made pictures of the balls
+# so that drawing a frame is mostly copying pixels
+#
+
+"""Cached pre-rendered ball sprites and text for fast drawing."""
+
+import functools
+import numpy as np
+import pygame
+from game import assets
+
+# Maps (radius, (r, g, b)) to the Surface with that ball drawn on it.
+_sprites = {}
+
+# Most pixels of stamped balls written with one index array, which bounds
+# the memory splat_balls uses however many balls share a radius.
+SPLAT_BLOCK = 1 << 22
+
+
+def sprite_size(radii):
+    """Return the side of the square sprite for each radius in radii."""
+    return 2 * np.ceil(radii).astype(int) + 2
+
+
+def ball_sprite(radius, color):
+    """Return the shared sprite of a ball of the given radius and color.
+
+    The ball is rasterized once onto a colorkeyed Surface in the display's
+    pixel format, so blitting it needs no conversion.
+    """
+    key = (radius, color)
+    sprite = _sprites.get(key)
+    if sprite is None:
+        size = int(sprite_size(radius))
+        sprite = pygame.Surface((size, size))
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        # Any color but the ball's own will do for the see-through key.
+        colorkey = (255, 0, 255) if color != (255, 0, 255) else (0, 255, 0)
+        sprite.fill(colorkey)
+        pygame.draw.circle(sprite, color, (size / 2, size / 2), radius)
+        sprite.set_colorkey(colorkey, pygame.RLEACCEL)
+        _sprites[key] = sprite
+    return sprite
+
+
+def ball_sprites(radii, colors):
+    """Return the sprite for every (radius, color) row, as a list."""
+    return [
+        ball_sprite(radius, tuple(color))
+        for radius, color in zip(radii.tolist(), colors.tolist())
+    ]
+
+
+def sprite_corners(centers, radii):
+    """Return the top-left blit position of each ball's sprite."""
+    half = (sprite_size(radii) / 2)[:, None]
+    return np.rint(centers - half).astype(int).tolist()
+
+
+@functools.lru_cache(maxsize=64)
+def disk_stamp(radius):
+    """Return (x offsets, y offsets) of the pixels in a disk of radius.
+
+    These are the pixels whose centers are within radius of the disk's
+    center pixel, as int arrays, computed once for each radius.
+    """
+    reach = int(np.ceil(radius))
+    offsets = np.arange(-reach, reach + 1)
+    x_offsets, y_offsets = np.meshgrid(offsets, offsets, indexing='ij')
+    inside = x_offsets**2 + y_offsets**2 <= radius * radius
+    return x_offsets[inside], y_offsets[inside]
+
+
+def map_colors(surface, colors):
+    """Return the pixel values of surface's format for (count, 3) colors.
+
+    This is Surface.map_rgb for every row at once, opaque if the format
+    has alpha.
+    """
+    colors = colors.astype(np.uint32)
+    red_shift, green_shift, blue_shift, _ = surface.get_shifts()
+    red_loss, green_loss, blue_loss, _ = surface.get_losses()
+    return (
+        ((colors[:, 0] >> red_loss) << red_shift)
+        | ((colors[:, 1] >> green_loss) << green_shift)
+        | ((colors[:, 2] >> blue_loss) << blue_shift)
+        | np.uint32(surface.get_masks()[3])
+    )
+
+
+def can_splat(surface):
+    """Return True if splat_balls can draw onto surface's pixel format."""
+    return surface.get_bytesize() in (2, 4)
+
+
+def _pixel_positions(centers, width, height):
+    """Return the x and y of the pixel each center is in, kept on screen."""
+    x_pixels = np.clip(centers[:, 0] + 0.5, 0, width - 1).astype(np.intp)
+    y_pixels = np.clip(centers[:, 1] + 0.5, 0, height - 1).astype(np.intp)
+    return x_pixels, y_pixels
+
+
+def splat_balls(surface, centers, radii, values):
+    """Draw balls by writing their pixels straight into surface.
+
+    values holds each ball's pixel value from map_colors. Balls smaller
+    than a pixel become single points, and the rest are stamped with the
+    precomputed disk of their radius, all in NumPy with no call per ball.
+    Balls are drawn a radius at a time, so where balls of different sizes
+    overlap either may end up on top, and they are not antialiased; at
+    the sizes this is used for neither shows.
+    """
+    pixels = pygame.surfarray.pixels2d(surface)
+    width, height = pixels.shape
+    values = values.astype(pixels.dtype, copy=False)
+    tiny = radii < 0.5
+    for radius in np.unique(radii[~tiny]).tolist():
+        rows = np.flatnonzero(radii == radius)
+        x_offsets, y_offsets = disk_stamp(radius)
+        block = max(SPLAT_BLOCK // len(x_offsets), 1)
+        for start in range(0, len(rows), block):
+            chosen = rows[start : start + block]
+            x_centers, y_centers = _pixel_positions(
+                centers[chosen], width, height
+            )
+            x_pixels = (x_centers[:, None] + x_offsets).ravel()
+            y_pixels = (y_centers[:, None] + y_offsets).ravel()
+            shown = (
+                (x_pixels >= 0)
+                & (x_pixels < width)
+                & (y_pixels >= 0)
+                & (y_pixels < height)
+            )
+            pixels[x_pixels[shown], y_pixels[shown]] = np.repeat(
+                values[chosen], len(x_offsets)
+            )[shown]
+    if tiny.all():
+        x_pixels, y_pixels = _pixel_positions(centers, width, height)
+    else:
+        values = values[tiny]
+        x_pixels, y_pixels = _pixel_positions(centers[tiny], width, height)
+    rows = pixels.T
+    if rows.flags.c_contiguous:
+        # One index into the rows laid end to end is quicker than two.
+        rows.reshape(-1)[y_pixels * width + x_pixels] = values
+    else:
+        pixels[x_pixels, y_pixels] = values
+    # The surface stays locked while its pixel array exists.
+    del pixels, rows
+
+
+def cache_size():
+    """Return how many sprites are cached."""
+    return len(_sprites)
+
+
+@functools.lru_cache(maxsize=256)
+def text(message, size, color, face=None):
+    """Return a shared antialiased rendering of one line of text.
+
+    face is a font file, pygame's default font if None. The least recently
+    used renderings are dropped once 256 are cached; color must be a tuple
+    so it can be part of the key.
+    """
+    if face is None:
+        face = pygame.font.get_default_font()
+    return assets.font_file(face, size).render(message, True, color)
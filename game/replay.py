@@ -0,0 +1,103 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file replay.py, which writes down the seed, settings and key
+# presses of a run so that the same run can be played again
+#
+
+"""Replay files holding a run's seed, parameters and input events."""
+
+import json
+import pygame
+
+
+class Replay:
+    """Everything needed to play a bouncing balls run again exactly.
+
+    Every ball comes from the seed, so a replay only holds the seed, the
+    scene's parameters and each input event with the number of physics
+    steps taken before it.
+    """
+
+    version = 1
+
+    # Only these events change what happens in the scene.
+    recorded_types = (pygame.KEYDOWN, pygame.QUIT)
+
+    def __init__(self, seed, params, events=()):
+        """Start a replay of the run from seed with the given parameters."""
+        self._seed = seed
+        self._params = dict(params)
+        self._events = [tuple(event) for event in events]
+        self._next = 0
+
+    @property
+    def seed(self):
+        """Return the seed every random stream of the run came from."""
+        return self._seed
+
+    @property
+    def params(self):
+        """Return the scene's parameters as a dict."""
+        return self._params
+
+    @property
+    def events(self):
+        """Return (step, event type, key) for every recorded event."""
+        return self._events
+
+    def record(self, step, event):
+        """Keep event, which came after step physics steps, if it matters."""
+        if event.type in Replay.recorded_types:
+            self._events.append((step, event.type, getattr(event, 'key', 0)))
+
+    def rewind(self):
+        """Go back to playing from the first event."""
+        self._next = 0
+
+    def events_before(self, step):
+        """Return the events to play before physics step number step."""
+        events = []
+        while (
+            self._next < len(self._events)
+            and self._events[self._next][0] <= step
+        ):
+            _, kind, key = self._events[self._next]
+            events.append(pygame.event.Event(kind, key=key))
+            self._next += 1
+        return events
+
+    def save(self, path):
+        """Write the replay to path as JSON."""
+        with open(path, 'w', encoding='utf-8') as replay_file:
+            json.dump(
+                {
+                    'version': Replay.version,
+                    'seed': self._seed,
+                    'params': self._params,
+                    'events': [list(event) for event in self._events],
+                },
+                replay_file,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Return the replay saved at path."""
+        try:
+            with open(path, encoding='utf-8') as replay_file:
+                data = json.load(replay_file)
+        except (OSError, ValueError) as error:
+            raise SystemExit(
+                f'Cannot read replay "{path}": {error}'
+            ) from error
+        if data.get('version') != cls.version:
+            raise SystemExit(
+                f'Replay "{path}" is version {data.get("version")}, '
+                f'expected {cls.version}'
+            )
+        return cls(data['seed'], data['params'], data['events'])
@@ -13,6 +13,7 @@
 """A list of RGB colors produced by X11's showrgb command. The color database
     is probably from an IRIX system circa 2005"""
 
+import numpy as np
 from pygame import Color
 
 
@@ -58,6 +59,52 @@ def tuple_to_color(color_tuple):
     return Color(*color_tuple)
 
 
+# The batch versions below take (N, 3) arrays of uint8 or float colors, or
+# anything that broadcasts against them, and return (N, 3) uint8 arrays.
+
+
+def _saturate(values):
+    """Clamp an array of channel values to 0..255 and make it uint8."""
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+def _channels(colors):
+    """Return colors as a float array for arithmetic without wrapping."""
+    return np.asarray(colors, dtype=float)
+
+
+def mult_colors(scalars, colors):
+    """Multiply every color by its scalar (or one scalar), saturating."""
+    scalars = np.asarray(scalars, dtype=float)
+    if scalars.ndim == 1:
+        scalars = scalars[:, None]
+    return _saturate(_channels(colors) * scalars)
+
+
+def mult_colrs(colors_a, colors_b):
+    """Multiply colors by colors channel by channel, saturating."""
+    return _saturate(_channels(colors_a) * _channels(colors_b))
+
+
+def sum_colors(colors_a, colors_b):
+    """Sum colors channel by channel, saturating at 255."""
+    return _saturate(_channels(colors_a) + _channels(colors_b))
+
+
+def diff_colors(colors_a, colors_b):
+    """Subtract colors channel by channel, saturating at 0."""
+    return _saturate(_channels(colors_a) - _channels(colors_b))
+
+
+def lerp_colors(colors_a, colors_b, t):
+    """Blend from colors_a (t = 0) to colors_b (t = 1) for every t."""
+    t = np.asarray(t, dtype=float)
+    if t.ndim == 1:
+        t = t[:, None]
+    colors_a = _channels(colors_a)
+    return _saturate(colors_a + (_channels(colors_b) - colors_a) * t)
+
+
 SNOW = (255, 250, 250)
 GHOST_WHITE = (248, 248, 255)
 GHOSTWHITE = (248, 248, 255)
@@ -811,3 +858,19 @@ DARK_RED = (139, 0, 0)
 DARKRED = (139, 0, 0)
 LIGHT_GREEN = (144, 238, 144)
 LIGHTGREEN = (144, 238, 144)
+
+
+def _named_colors():
+    """Return (name, color) for every color constant in this module."""
+    return [
+        (name, value)
+        for name, value in globals().items()
+        if name.isupper() and isinstance(value, tuple) and len(value) == 3
+    ]
+
+
+# Every named color as one (N, 3) uint8 array, and each name's row in it.
+PALETTE = np.array([color for _, color in _named_colors()], dtype=np.uint8)
+PALETTE_INDEX = {
+    name: index for index, (name, _) in enumerate(_named_colors())
+}
@@ -12,13 +12,20 @@
 
 """Scene objects for making games with PyGame."""
 
-import sys
 import random
+import numpy as np
 import pygame
 from more_itertools import grouper
-from game import rgbcolors
-from game.ball import Ball
+from game import assets, render, rgbcolors, snapshot
+from game.audio import SoundScheduler
+from game.ball import Ball, random_colors, random_velocities
 from game.animation import Explosion
+from game.parallel import StripSystem
+from game.physics import BallSystem, make_broadphase
+from game.placement import place_balls
+from game.profiling import FrameProfiler
+from game.recorder import TrajectoryRecorder
+from game.replay import Replay
 
 
 class Scene:
@@ -30,6 +37,8 @@ class Scene:
         self._background = pygame.Surface(self._screen.get_size())
         self._background.fill(background_color)
         self._frame_rate = 60
+        self._physics_rate = 60
+        self._alpha = 1.0
         self._is_valid = True
         self._soundtrack = soundtrack
         self._render_updates = None
@@ -57,6 +66,13 @@ class Scene:
     def render_updates(self):
         """Render all sprite updates."""
 
+    def dirty_rects(self):
+        """Return the Rects changed by this frame, or None for all of it."""
+        return None
+
+    def redraw(self):
+        """Make the next draw repaint the whole screen."""
+
     def update_scene(self):
         """Update the scene state."""
 
@@ -78,9 +94,20 @@ class Scene:
             pygame.mixer.music.stop()
 
     def frame_rate(self):
-        """Return the frame rate the scene desires."""
+        """Return the frame rate the scene desires; 0 means uncapped."""
         return self._frame_rate
 
+    def physics_rate(self):
+        """Return how many times a second update_scene should be called."""
+        return self._physics_rate
+
+    def interpolate(self, alpha):
+        """Set how far between the last two updates the next draw falls."""
+        self._alpha = alpha
+
+    def end_frame(self):
+        """Finish a frame, once it has been stepped and drawn."""
+
 
 class EmptyPressAnyKeyScene(Scene):
     """Empty scene where it will invalidate when a key is pressed."""
@@ -107,6 +134,8 @@ class SplashScene(EmptyPressAnyKeyScene):
         super().__init__(screen, rgbcolors.SNOW, soundtrack)
         self._message = message
         self._words_per_line = 5
+        self._layout = None
+        self._layout_size = None
 
     def _split_message(self):
         """Given a message split it up according to how many words per line."""
@@ -117,28 +146,38 @@ class SplashScene(EmptyPressAnyKeyScene):
         for line in lines:
             yield line
 
+    def _lay_out(self):
+        """Return the (surface, position) of every line for this screen.
+
+        The layout only changes with the screen size, so it is worked out
+        once per size.
+        """
+        size = self._screen.get_size()
+        if self._layout_size != size:
+            (width, height) = size
+            press_any_key = render.text('Press any key.', 18, rgbcolors.BLACK)
+            any_key_pos = press_any_key.get_rect(
+                center=(width / 2, height - 50)
+            )
+            start_pos = (height / 2) - (
+                (len(self._message.split()) // self._words_per_line) * 30
+            )
+            offset = 0
+            self._layout = []
+            for line in self._split_message():
+                line = render.text(line, 25, rgbcolors.BLACK)
+                line_pos = line.get_rect(
+                    center=(width / 2, start_pos + offset)
+                )
+                offset += 30
+                self._layout.append((line, line_pos))
+            self._layout.append((press_any_key, any_key_pos))
+            self._layout_size = size
+        return self._layout
+
     def draw(self):
         super().draw()
-        (width, height) = self._screen.get_size()
-        press_any_key_font = pygame.font.Font(
-            pygame.font.get_default_font(), 18
-        )
-        press_any_key = press_any_key_font.render(
-            'Press any key.', True, rgbcolors.BLACK
-        )
-        any_key_pos = press_any_key.get_rect(center=(width / 2, height - 50))
-
-        font = pygame.font.Font(pygame.font.get_default_font(), 25)
-        start_pos = (height / 2) - (
-            (len(self._message.split()) // self._words_per_line) * 30
-        )
-        offset = 0
-        for line in self._split_message():
-            line = font.render(line, True, rgbcolors.BLACK)
-            line_pos = line.get_rect(center=(width / 2, start_pos + offset))
-            offset += 30
-            self._screen.blit(line, line_pos)
-        self._screen.blit(press_any_key, any_key_pos)
+        self._screen.blits(self._lay_out(), doreturn=False)
 
 
 class BlinkingTitle(EmptyPressAnyKeyScene):
@@ -156,41 +195,62 @@ class BlinkingTitle(EmptyPressAnyKeyScene):
         )
         self._size = size
         self._message = message
-        self._t = 0.0
-        self._delta_t = 0.01
-
-    def _interpolate(self):
-        # This can be done with pygame.Color.lerp
-        self._t += self._delta_t
-        if self._t > 1.0 or self._t < 0.0:
-            self._delta_t *= -1
-        color = rgbcolors.sum_color(
-            rgbcolors.mult_color(
-                (1.0 - self._t), self._message_complement_color
-            ),
-            rgbcolors.mult_color(self._t, self._message_color),
+        self._background_color = background_color
+        self._title = None
+        self._palettes = None
+        self._frame = 0
+
+    def _blink_colors(self):
+        """Return the title's color on every frame of one blink."""
+        steps = []
+        t = 0.0
+        delta_t = 0.01
+        flips = 0
+        while flips < 2:
+            t += delta_t
+            if t > 1.0 or t < 0.0:
+                delta_t *= -1
+                flips += 1
+            steps.append(t)
+        return rgbcolors.lerp_colors(
+            self._message_complement_color[:3], self._message_color[:3], steps
         )
-        return color
 
-    def draw(self):
-        super().draw()
-        presskey_font = pygame.font.Font(
-            pygame.font.get_default_font(), self._size
-        )
-        presskey = presskey_font.render(
-            self._message, True, self._interpolate()
-        )
-        (width, height) = self._screen.get_size()
-        presskey_pos = presskey.get_rect(center=(width / 2, height / 2))
-        press_any_key_font = pygame.font.Font(
-            pygame.font.get_default_font(), 18
+    def _prepare_title(self):
+        """Render the title once and work out every palette it blinks through.
+
+        The title is rendered as an 8-bit surface whose palette runs from
+        the background color to the text color. Recoloring it is then just
+        swapping in the palette for the frame's color.
+        """
+        font = assets.font_file(pygame.font.get_default_font(), self._size)
+        self._title = font.render(
+            self._message, True, rgbcolors.WHITE, self._background_color
         )
-        press_any_key = press_any_key_font.render(
-            'Press any key.', True, rgbcolors.BLACK
+        steps = np.arange(256)[None, :, None] / 255
+        ramps = rgbcolors.lerp_colors(
+            self._background_color[:3], self._blink_colors()[:, None], steps
         )
+        self._palettes = [
+            [tuple(entry) for entry in ramp] for ramp in ramps.tolist()
+        ]
+        self._frame = 0
+
+    def start_scene(self):
+        super().start_scene()
+        self._prepare_title()
+
+    def draw(self):
+        super().draw()
+        if self._title is None:
+            self._prepare_title()
+        self._title.set_palette(self._palettes[self._frame])
+        self._frame = (self._frame + 1) % len(self._palettes)
         (width, height) = self._screen.get_size()
+        presskey_pos = self._title.get_rect(center=(width / 2, height / 2))
+        press_any_key = render.text('Press any key.', 18, rgbcolors.BLACK)
         any_key_pos = press_any_key.get_rect(center=(width / 2, height - 50))
-        self._screen.blit(presskey, presskey_pos)
+        self._screen.blit(self._title, presskey_pos)
         self._screen.blit(press_any_key, any_key_pos)
 
 
@@ -198,42 +258,234 @@ class BouncingBallsScene(Scene):
     """Bounding balls demo."""
 
     def __init__(
-        self, num_balls, screen, background_color, frame_rate, soundtrack=None
+        self,
+        num_balls,
+        screen,
+        background_color,
+        frame_rate,
+        soundtrack=None,
+        broadphase='grid',
+        physics_rate=60,
+        dirty_rects=False,
+        ccd=False,
+        seed=None,
+        replay=None,
+        record=None,
+        profile=None,
+        profile_summary=False,
+        snapshot_path=None,
+        checkpoint=None,
+        trajectory=None,
+        trajectory_every=1,
+        splat_above=50000,
     ):
+        """Init the scene; broadphase is 'grid', 'sweep', 'brute' or 'strips'.
+
+        The balls are drawn up to frame_rate times a second (0 for as fast
+        as possible) while physics steps physics_rate times a second. With
+        dirty_rects only the areas that changed are redrawn and pushed to
+        the display. With ccd the balls bounce at the moment they touch
+        instead of once they overlap, so they cannot pass through each
+        other at low physics rates.
+
+        Placement, velocities, colors and lifetimes each draw from their own
+        stream seeded from seed, or from the random module if it is None.
+        A Replay given as replay supplies the seed and plays back its input
+        events, and a replay of the run is saved to the path record when
+        the scene ends.
+
+        The c key starts and stops the profiler, and profile, a (first,
+        last) pair of frame numbers, profiles that window of frames. With
+        profile_summary a text summary is saved next to each .pstats file.
+
+        With snapshot_path the balls are loaded from that snapshot file instead
+        of being placed, and with checkpoint they are saved to that file
+        when the scene ends.
+
+        With trajectory every ball's position, velocity and alive flag are
+        recorded to that file every trajectory_every physics steps.
+
+        With more than splat_above balls they are written straight into the
+        screen's pixels with NumPy instead of blitted one by one, and every
+        frame is redrawn whole.
+        """
         super().__init__(screen, background_color, soundtrack)
+        self._frame_rate = frame_rate
+        self._physics_rate = physics_rate
+        # Velocities are in pixels per 1/60 s; scale them to one step.
+        self._step = 60 / physics_rate
+        self._num_balls = num_balls
         self._pause_game = False
         self._boundary_rect = self._screen.get_rect()
-        self._balls = []
+        self._system = BallSystem()
+        self._broadphase_name = broadphase
+        self._broadphase = None
+        # Ball views are only made for the balls that need one, by index.
+        self._balls = {}
+        self._annotate = False
+        self._muted = False
         self._render_updates = None
         self._explode_toggle = False
+        self._dirty_mode = dirty_rects
+        self._ccd = ccd
+        self._quiescent = False
+        self._seed = seed
+        self._replay = replay
+        self._record = record
+        self._log = None
+        self._steps = 0
+        self._frames = 0
+        self._profile_window = profile
+        self._profiler = FrameProfiler(summary=profile_summary)
+        self._snapshot_path = snapshot_path
+        self._checkpoint = checkpoint
+        self._trajectory = trajectory
+        self._trajectory_every = trajectory_every
+        self._recorder = None
+        self._sounds = None
+        self._splat_above = splat_above
+        self._splat = False
+        self._dirty = None
+        # What each ball covered, its color and its sprite when last drawn.
+        self._drawn_rects = []
+        self._drawn_colors = None
+        self._sprites = []
+        # Each ball's pixel value in the screen's format, when splatting.
+        self._pixel_values = None
+        # Explosion areas from the last frame, which may have erased balls.
+        self._sprite_rects = []
 
     def start_scene(self):
         super().start_scene()
-        if len(sys.argv) > 1:
-            num_balls = int(sys.argv[1])
-            num_balls = min(num_balls, 45)
+        if self._replay is not None:
+            seed = self._replay.seed
+            self._replay.rewind()
+        elif self._seed is not None:
+            seed = self._seed
         else:
-            num_balls = 5
-
-        xlist = list(range(26, 775))
-        ylist = list(range(26, 775))
-        for i in range(num_balls):
-            x_range = random.choice(xlist)
-            bottom = x_range - 15 - 25
-            bottom = max(bottom, 0)
-            top = x_range + 15 - 25
-            top = min(top, 748)
-            del xlist[bottom:top]
-            y_range = random.choice(ylist)
-            bottom = y_range - 15 - 25
-            bottom = max(bottom, 0)
-            top = y_range + 15 - 25
-            top = min(top, 748)
-            del ylist[bottom:top]
-            self._balls.append(Ball(i, x_range, y_range, sound_on=False))
+            # Draw from the random module so random.seed() repeats a run.
+            seed = random.getrandbits(64)
+        self._log = Replay(seed, self._params())
+        self._steps = 0
+        self._frames = 0
+        if self._snapshot_path:
+            self.load_snapshot(self._snapshot_path)
+        else:
+            self._use_system(self._spawn_balls(seed))
 
         self._render_updates = pygame.sprite.RenderUpdates()
         Explosion.containers = self._render_updates
+        # A window from frame 0 starts before the first frame is stepped.
+        self._profile_edge()
+
+    def _spawn_balls(self, seed):
+        """Return a BallSystem of balls placed and colored from seed."""
+        placement, velocity, color, lifetime = (
+            np.random.default_rng(stream)
+            for stream in np.random.SeedSequence(seed).spawn(4)
+        )
+        count = self._num_balls
+        radius, centers = place_balls(
+            count, self._boundary_rect, Ball.default_radius, placement
+        )
+        system = BallSystem(count)
+        system.spawn(
+            centers,
+            random_velocities(count, velocity),
+            radius,
+            random_colors(count, color),
+            lifetime.integers(5, 10, size=count, endpoint=True),
+        )
+        return system
+
+    def _use_system(self, system):
+        """Make system the scene's balls and start drawing them afresh."""
+        self._system.close()
+        if self._broadphase_name == 'strips' and not self._ccd:
+            system = StripSystem.copy_of(system)
+        self._system = system
+        self._num_balls = len(system)
+        self._balls = {}
+        radius = system.radii.max() if len(system) else Ball.default_radius
+        self._broadphase = make_broadphase(self._broadphase_name, 2 * radius)
+        self._quiescent = False
+        self._splat = len(system) > self._splat_above and render.can_splat(
+            self._screen
+        )
+        # The sprites and pixel values were made for the old balls' radii
+        # and colors, even when there are as many new ones.
+        self._drawn_rects = []
+        self._drawn_colors = None
+        self._sprites = []
+        self._pixel_values = None
+        self._sounds = SoundScheduler(Ball.bounce_sound)
+        self._close_recorder()
+        if self._trajectory:
+            self._recorder = TrajectoryRecorder(
+                self._trajectory, len(system), self._trajectory_every
+            )
+
+    def _ball(self, index):
+        """Return a Ball view of ball index.
+
+        Views are only kept while annotations are on, to hold the rendered
+        names; otherwise each is made when needed and dropped after.
+        """
+        ball = self._balls.get(index)
+        if ball is None:
+            ball = Ball.view(self._system, index, sound_on=self._muted)
+            if self._annotate:
+                ball.toggle_draw_text()
+                self._balls[index] = ball
+        return ball
+
+    def _close_recorder(self):
+        """Finish writing the trajectory being recorded, if there is one."""
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+            print(f'Saved the trajectory to {self._trajectory}')
+
+    def save_snapshot(self, path):
+        """Save the state of every ball to the snapshot file at path."""
+        snapshot.save(self._system, path)
+        print(f'Saved {len(self._system)} balls to {path}')
+
+    def load_snapshot(self, path):
+        """Replace every ball with the ones in the snapshot file at path."""
+        self._use_system(snapshot.load(path))
+        print(f'Loaded {len(self._system)} balls from {path}')
+
+    def end_scene(self):
+        super().end_scene()
+        self._profiler.stop(self._frames, self._num_balls)
+        if self._checkpoint:
+            self.save_snapshot(self._checkpoint)
+        self._close_recorder()
+        self._system.close()
+        if self._record and self._log is not None:
+            self._log.save(self._record)
+            print(f'Saved the replay to {self._record}')
+
+    def _params(self):
+        """Return the parameters a replay needs to rebuild this scene."""
+        return {
+            'num_balls': self._num_balls,
+            'broadphase': self._broadphase_name,
+            'physics_rate': self._physics_rate,
+            'ccd': self._ccd,
+            'snapshot': self._snapshot_path,
+        }
+
+    @property
+    def replay(self):
+        """Return the Replay being recorded of the current run."""
+        return self._log
+
+    @property
+    def system(self):
+        """Return the BallSystem holding the state of every ball."""
+        return self._system
 
     def _draw_boundaries(self):
         (width, height) = self._screen.get_size()
@@ -247,14 +499,26 @@ class BouncingBallsScene(Scene):
 
     def process_event(self, event):
         super().process_event(event)
+        if self._log is not None:
+            self._log.record(self._steps, event)
 
         if event.type == pygame.KEYDOWN and event.key == pygame.K_a:
-            for ball in self._balls:
-                ball.toggle_draw_text()
+            self._annotate = not self._annotate
+            # Views are kept only while annotating; new ones pick this up.
+            self._balls = {}
+            self._drawn_rects = []
             print('Annotations have been toggled.')
 
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_d:
+            self._dirty_mode = not self._dirty_mode
+            self._drawn_rects = []
+            print('Dirty rectangle drawing has been toggled.')
+
         if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
             self._pause_game = not self._pause_game
+            # Draw the balls where they are, not between their last two
+            # steps, while no steps are taken.
+            self._system.settle()
             print('Pause has been toggled.')
 
         if event.type == pygame.KEYDOWN and event.key == pygame.K_e:
@@ -262,10 +526,14 @@ class BouncingBallsScene(Scene):
             print('Explosions have been toggled.')
 
         if event.type == pygame.KEYDOWN and event.key == pygame.K_s:
-            for ball in self._balls:
+            self._muted = not self._muted
+            for ball in self._balls.values():
                 ball.toggle_sound()
             print('Sound effects have been toggled.')
 
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_c:
+            self._profiler.toggle(self._frames, self._num_balls)
+
         if event.type == pygame.KEYDOWN and event.key == pygame.K_x:
             self._is_valid = False
             print('The scene has exited.')
@@ -289,40 +557,153 @@ class BouncingBallsScene(Scene):
             self._render_updates.clear(self._screen, self._background)
             self._render_updates.update()
             dirty = self._render_updates.draw(self._screen)
+            if self._dirty is not None:
+                self._dirty.extend(dirty)
+            self._sprite_rects = dirty
+
+    def redraw(self):
+        self._drawn_rects = []
+
+    def end_frame(self):
+        """Start the frame's sounds and count it for profiled windows."""
+        self._sounds.play(lambda index: self._ball(index).bounce_volume)
+        self._frames += 1
+        self._profile_edge()
+
+    def _profile_edge(self):
+        """Start or stop the profiler if a profiled window begins or ends.
+
+        _frames frames are done, so a (first, last) window profiles frames
+        first to last - 1, counting from 0.
+        """
+        if self._profile_window is None:
+            return
+        first, last = self._profile_window
+        if self._frames == first:
+            self._profiler.start(self._frames)
+        elif self._frames == last:
+            self._profiler.stop(self._frames, self._num_balls)
+
+    def dirty_rects(self):
+        """Return the merged Rects this frame changed, or None for all."""
+        if self._dirty is None:
+            return None
+        (width, height) = self._screen.get_size()
+        area = sum(rect.width * rect.height for rect in self._dirty)
+        if area > width * height // 2:
+            # Past this many pixels one full update is cheaper.
+            return None
+        return self._dirty
+
+    def _draw_balls(self, centers):
+        """Draw every ball and return (drawn Rects, which balls recolored).
+
+        Each ball is a cached sprite, so all of them go to the screen in a
+        single Surface.blits call; only the sprites of balls whose color
+        changed since the last frame are looked up again.
+        """
+        system = self._system
+        colors = system.colors
+        if len(self._sprites) != len(colors):
+            self._sprites = render.ball_sprites(system.radii, colors)
+            self._drawn_colors = colors.copy()
+            recolored = np.ones(len(colors), dtype=bool)
+        else:
+            recolored = np.any(colors != self._drawn_colors, axis=1)
+            for index in np.flatnonzero(recolored).tolist():
+                self._sprites[index] = render.ball_sprite(
+                    system.radii[index], tuple(colors[index].tolist())
+                )
+            self._drawn_colors[...] = colors
+        drawn = self._screen.blits(
+            zip(self._sprites, render.sprite_corners(centers, system.radii)),
+            doreturn=True,
+        )
+        if self._annotate:
+            for index, center in enumerate(centers.tolist()):
+                drawn[index] = drawn[index].union(
+                    self._ball(index).draw_name(self._screen, center)
+                )
+        return drawn, recolored.tolist()
+
+    def _splat_balls(self, centers):
+        """Write every ball into the screen's pixels with NumPy.
+
+        Like the sprites, each ball's pixel value is looked up again only
+        when its color changed since the last frame.
+        """
+        colors = self._system.colors
+        values = self._pixel_values
+        if values is None or len(values) != len(colors):
+            self._pixel_values = render.map_colors(self._screen, colors)
+            self._drawn_colors = colors.copy()
+        else:
+            # Reducing along rows of three is slow; find the changed
+            # channels in one pass and take their rows instead.
+            changed = np.flatnonzero(colors != self._drawn_colors)
+            recolored = np.unique(changed // colors.shape[1])
+            if len(recolored):
+                self._pixel_values[recolored] = render.map_colors(
+                    self._screen, colors[recolored]
+                )
+                self._drawn_colors[recolored] = colors[recolored]
+        render.splat_balls(
+            self._screen, centers, self._system.radii, self._pixel_values
+        )
 
     def draw(self):
-        super().draw()
-        for ball in self._balls:
-            ball.draw(self._screen)
+        centers = self._system.interpolate(self._alpha)
+        if self._splat:
+            super().draw()
+            self._splat_balls(centers)
+            self._dirty = None
+            self._draw_boundaries()
+            return
+        if not self._dirty_mode or len(self._drawn_rects) != len(centers):
+            super().draw()
+            self._drawn_rects = self._draw_balls(centers)[0]
+            self._dirty = None
+            self._draw_boundaries()
+            return
+
+        # Wipe every ball off, then draw them all back. Only the balls that
+        # moved or changed color, and the area explosions touched last
+        # frame, need to be pushed to the display.
+        for rect in self._drawn_rects:
+            self._screen.blit(self._background, rect, rect)
+        drawn, recolored = self._draw_balls(centers)
+        self._dirty = [
+            old.union(new)
+            for old, new, changed in zip(self._drawn_rects, drawn, recolored)
+            if changed or old != new
+        ]
+        self._dirty.extend(self._sprite_rects)
+        self._drawn_rects = drawn
         self._draw_boundaries()
 
     def update_scene(self):
-        if not self._pause_game:
+        if self._replay is not None:
+            for event in self._replay.events_before(self._steps):
+                self.process_event(event)
+            if not self._is_valid:
+                return
+        self._steps += 1
+        if not self._pause_game and not self._quiescent:
             super().update_scene()
-            for ball in self._balls:
-                ball.update()
-
-            for index, ball in enumerate(self._balls):
-                for other_ball in self._balls[index + 1 :]:
-                    if ball.collide_with(other_ball):
-
-                        ball.separate_from(other_ball, self._boundary_rect)
-                        ball.bounce(other_ball)
-                        other_ball.bounce(ball)
-
-                        if not ball.is_alive() and not self._explode_toggle:
-                            Explosion(ball)
-                        if (
-                            not other_ball.is_alive()
-                            and not self._explode_toggle
-                        ):
-                            Explosion(other_ball)
-
-                        ball.check_collision(
-                            other_ball,
-                            self._explode_toggle,
-                            self._boundary_rect,
-                        )
-                        other_ball.check_collision(
-                            ball, self._explode_toggle, self._boundary_rect
-                        )
+            rect = self._boundary_rect
+            if self._ccd:
+                first, second, exploded = self._system.sweep(self._step, rect)
+            else:
+                first, second, exploded = self._system.step(
+                    self._step, rect, self._broadphase
+                )
+            self._sounds.collide(first, second)
+            if not self._explode_toggle:
+                for index in exploded.tolist():
+                    Explosion(self._ball(index))
+            if self._recorder is not None:
+                self._recorder.record(self._steps, self._system)
+            if self._system.quiescent:
+                # Every ball is dead, so nothing will ever move again.
+                self._quiescent = True
+                self._system.settle()
@@ -0,0 +1,120 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file snapshot.py, which saves the state of every ball to a
+# binary file and opens such files again without reading them in
+#
+
+"""Versioned columnar snapshots of a BallSystem, opened with memmap."""
+
+import os
+import struct
+import tempfile
+import numpy as np
+from game.physics import BallSystem
+
+MAGIC = b'BALLSNAP'
+VERSION = 1
+
+# Magic, version, column count, ball count and total collisions.
+HEADER = struct.Struct('<8sHHQQ')
+
+# Each column is stored whole, one after the other, starting on a multiple
+# of ALIGNMENT bytes so it can be mapped straight into an array.
+COLUMNS = (
+    ('positions', '<f8', (2,)),
+    ('velocities', '<f8', (2,)),
+    ('radii', '<f8', ()),
+    ('colors', 'u1', (3,)),
+    ('bounce_counts', '<i8', ()),
+    ('collisions', '<i8', ()),
+    ('alive', '?', ()),
+)
+ALIGNMENT = 64
+
+
+def _layout(count):
+    """Return (name, dtype, shape, offset) of every column for count balls."""
+    layout = []
+    offset = HEADER.size
+    for name, dtype, row_shape in COLUMNS:
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        shape = (count,) + row_shape
+        layout.append((name, np.dtype(dtype), shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout
+
+
+def save(system, path):
+    """Write every ball of system to the snapshot file at path.
+
+    The balls may have been loaded from path, and the columns the run has
+    not written to are still read from that file, so the snapshot is
+    written to a new file beside it that then takes its place.
+    """
+    count = len(system)
+    header = HEADER.pack(
+        MAGIC, VERSION, len(COLUMNS), count, system.total_collisions
+    )
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(
+        prefix='.snapshot-', suffix='.tmp', dir=directory
+    )
+    try:
+        # mkstemp makes a file only its owner can read; give it the mode
+        # open() would have.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temporary, 0o666 & ~umask)
+        with os.fdopen(handle, 'wb') as snapshot_file:
+            snapshot_file.write(header)
+            for name, dtype, _, offset in _layout(count):
+                snapshot_file.write(b'\0' * (offset - snapshot_file.tell()))
+                column = np.ascontiguousarray(
+                    getattr(system, name), dtype=dtype
+                )
+                column.tofile(snapshot_file)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def load(path):
+    """Return a BallSystem whose arrays are mapped from the snapshot at path.
+
+    Nothing is read until it is used. The mapping is copy-on-write, so the
+    balls can move without the file changing.
+    """
+    try:
+        with open(path, 'rb') as snapshot_file:
+            header = snapshot_file.read(HEADER.size)
+    except OSError as error:
+        raise SystemExit(f'Cannot open snapshot "{path}": {error}') from error
+    if len(header) < HEADER.size:
+        raise SystemExit(f'"{path}" is too short to be a snapshot')
+    magic, version, columns, count, total_collisions = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise SystemExit(f'"{path}" is not a snapshot')
+    if version != VERSION or columns != len(COLUMNS):
+        raise SystemExit(
+            f'Snapshot "{path}" is version {version}, expected {VERSION}'
+        )
+    arrays = {}
+    for name, dtype, shape, offset in _layout(count):
+        if not count:
+            # An empty file region cannot be mapped.
+            arrays[name] = np.zeros(shape, dtype)
+            continue
+        try:
+            arrays[name] = np.memmap(path, dtype, 'c', offset, shape)
+        except ValueError as error:
+            raise SystemExit(
+                f'Snapshot "{path}" is cut short: {error}'
+            ) from error
+    return BallSystem.from_columns(total_collisions=total_collisions, **arrays)
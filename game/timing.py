@@ -0,0 +1,160 @@
+# Brian Loewe
+# CPSC 386-03
+# 2022-05-09
+# bloewe@csu.fullerton.edu
+# @bloewe21
+#
+# Lab 05-00
+#
+# This is the file timing.py, which measures how long each part of every
+# frame takes and shows or saves the numbers
+#
+
+"""Per-phase frame timings, an on-screen overlay and a JSON export."""
+
+import json
+import time
+import numpy as np
+import pygame
+from game import assets, rgbcolors
+
+# The parts of a frame, in the order VideoGame.run does them.
+PHASES = ('sleep', 'events', 'update', 'draw', 'render_updates', 'display')
+SLEEP, EVENTS, UPDATE, DRAW, RENDER_UPDATES, DISPLAY = range(len(PHASES))
+
+# Histogram bin edges in milliseconds, doubling from a quarter of one. The
+# last bin also holds everything slower.
+EDGES_MS = np.concatenate(([0.0], 0.25 * 2.0 ** np.arange(11)))
+
+
+class FrameTimer:
+    """Ring buffer of how long each phase of the last frames took.
+
+    The buffer is allocated once. When it wraps, the frames in it are
+    added to a histogram per phase, so the histograms cover the whole run.
+    """
+
+    def __init__(self, size=600):
+        """Keep the timings of the last size frames."""
+        self._times = np.zeros((size, len(PHASES)))
+        self._counts = np.zeros((len(PHASES), len(EDGES_MS) - 1), np.int64)
+        self._frames = 0
+        self._row = 0
+        self._last = 0.0
+
+    @property
+    def frames(self):
+        """Return how many frames have been timed."""
+        return self._frames
+
+    def start(self):
+        """Begin timing a frame."""
+        self._row = self._frames % len(self._times)
+        self._times[self._row] = 0.0
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the last lap to phase, one of PHASES."""
+        now = time.perf_counter()
+        self._times[self._row, phase] += now - self._last
+        self._last = now
+
+    def finish(self):
+        """End the frame being timed."""
+        self._frames += 1
+        if self._row == len(self._times) - 1:
+            self._counts += self._histograms(self._times)
+
+    def recent(self):
+        """Return the timings in seconds of the frames still buffered."""
+        return self._times[: min(self._frames, len(self._times))]
+
+    @staticmethod
+    def _histograms(times):
+        """Return the count in each EDGES_MS bin of each phase's times."""
+        clipped = np.minimum(times * 1000, EDGES_MS[-1])
+        return np.array(
+            [np.histogram(column, EDGES_MS)[0] for column in clipped.T]
+        )
+
+    def summary(self):
+        """Return (mean, p50, p99) in milliseconds of each phase, recently."""
+        times = self.recent() * 1000
+        if not len(times):
+            return [(0.0, 0.0, 0.0)] * len(PHASES)
+        means = times.mean(axis=0)
+        medians, tails = np.percentile(times, (50, 99), axis=0)
+        return list(zip(means.tolist(), medians.tolist(), tails.tolist()))
+
+    def dump(self, path):
+        """Write every phase's histogram and recent percentiles as JSON."""
+        # Add the frames buffered since the ring last wrapped.
+        unfolded = self._times[: self._frames % len(self._times)]
+        counts = self._counts + self._histograms(unfolded)
+        report = {
+            'frames': self._frames,
+            'edges_ms': EDGES_MS.tolist(),
+            'phases': {},
+        }
+        for name, phase_counts, (mean, median, tail) in zip(
+            PHASES, counts.tolist(), self.summary()
+        ):
+            report['phases'][name] = {
+                'counts': phase_counts,
+                'recent_mean_ms': mean,
+                'recent_p50_ms': median,
+                'recent_p99_ms': tail,
+            }
+        with open(path, 'w', encoding='utf-8') as timings_file:
+            json.dump(report, timings_file, indent=2)
+
+
+class TimingOverlay:
+    """Table of a FrameTimer's rolling mean, p50 and p99 per phase."""
+
+    # Frames between refreshes, so the numbers can be read.
+    refresh = 30
+
+    def __init__(self, timer):
+        """Show the timings kept by timer."""
+        self._timer = timer
+        self._surface = None
+        self._refreshed_at = None
+
+    def _render(self):
+        """Draw the table onto a new opaque Surface."""
+        font = assets.font(None, 20)
+        rows = [('phase', 'mean ms', 'p50 ms', 'p99 ms')]
+        for name, stats in zip(PHASES, self._timer.summary()):
+            rows.append((name,) + tuple(f'{value:.2f}' for value in stats))
+        cells = [
+            [font.render(cell, True, rgbcolors.WHITE) for cell in row]
+            for row in rows
+        ]
+        # The name column is left aligned and the numbers right aligned.
+        widths = [
+            max(row[column].get_width() for row in cells) + 12
+            for column in range(len(rows[0]))
+        ]
+        height = font.get_linesize()
+        surface = pygame.Surface((sum(widths) + 8, height * len(rows) + 8))
+        surface.fill(rgbcolors.BLACK)
+        for row, line in enumerate(cells):
+            top = 4 + row * height
+            surface.blit(line[0], (4, top))
+            right = 4 + widths[0]
+            for cell, width in zip(line[1:], widths[1:]):
+                right += width
+                surface.blit(cell, cell.get_rect(topright=(right - 12, top)))
+        return surface
+
+    def draw(self, screen):
+        """Draw the table in the top left corner and return its Rect."""
+        frames = self._timer.frames
+        if (
+            self._surface is None
+            or frames - self._refreshed_at >= TimingOverlay.refresh
+        ):
+            self._surface = self._render()
+            self._refreshed_at = frames
+        return screen.blit(self._surface, (10, 10))